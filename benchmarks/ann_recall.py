@@ -0,0 +1,84 @@
+"""Recall@k and query latency of IVF/HNSW indexes against the flat index.
+
+Embeds the files/ corpus through the shared embedding cache (real OpenAI
+embeddings by default, or the fake server with --fake) and compares every
+index type on the same vectors.
+
+    python benchmarks/ann_recall.py --k 4 --nprobe 8 --ef-search 64
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain.embeddings import CacheBackedEmbeddings, OpenAIEmbeddings
+
+from benchmarks.fake_embeddings_server import serve
+from core.splitter import get_splitter
+from core.stores import open_byte_store
+from core.vectorstore import build_index, tune_index
+
+PORT = 8765
+
+
+def load_texts():
+    splitter = get_splitter(separator="\n", chunk_size=600, chunk_overlap=100)
+    texts = []
+    for path in sorted(glob.glob("./files/*.txt")):
+        with open(path, encoding="utf-8") as f:
+            texts.extend(splitter.split_text(f.read()))
+    return texts
+
+
+def measure(index, queries, expected, k):
+    started_at = time.perf_counter()
+    _, found = index.search(queries, k)
+    latency = (time.perf_counter() - started_at) / len(queries)
+    hits = sum(len(set(e) & set(f)) for e, f in zip(expected, found))
+    return hits / expected.size, latency
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--fake", action="store_true")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.fake:
+        serve(PORT)
+        embeddings = OpenAIEmbeddings(
+            openai_api_base=f"http://127.0.0.1:{PORT}/v1", openai_api_key="fake"
+        )
+        namespace = "fake"
+    else:
+        embeddings = OpenAIEmbeddings()
+        namespace = "openai"
+    store = open_byte_store(f"./.cache/embeddings/{namespace}.sqlite")
+    cached_embeddings = CacheBackedEmbeddings.from_bytes_store(embeddings, store)
+
+    texts = load_texts()
+    vectors = np.array(cached_embeddings.embed_documents(texts), dtype=np.float32)
+    queries = vectors + np.random.default_rng(0).normal(
+        scale=0.01, size=vectors.shape
+    ).astype(np.float32)
+    print(f"{len(texts)} chunks, {vectors.shape[1]} dimensions, k={args.k}")
+
+    flat = build_index(vectors, index_type="flat")
+    _, expected = flat.search(queries, args.k)
+    print(f"{'flat':6} recall@{args.k}=1.000 latency={measure(flat, queries, expected, args.k)[1] * 1e6:.0f}us")
+    for index_type in ("ivf", "hnsw"):
+        index = tune_index(
+            build_index(vectors, index_type=index_type),
+            nprobe=args.nprobe,
+            ef_search=args.ef_search,
+        )
+        recall, latency = measure(index, queries, expected, args.k)
+        print(f"{index_type:6} recall@{args.k}={recall:.3f} latency={latency * 1e6:.0f}us")
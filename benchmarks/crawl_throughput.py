@@ -0,0 +1,44 @@
+"""Compare SitemapLoader with the async crawler against the fake docs site.
+
+    python benchmarks/crawl_throughput.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.document_loaders import SitemapLoader
+
+from benchmarks.fake_site_server import serve
+from core import runtime
+from core.crawler import SitemapCrawler
+
+PORT = 8766
+PAGES = 100
+SITEMAP_URL = f"http://127.0.0.1:{PORT}/sitemap.xml"
+
+
+if __name__ == "__main__":
+    serve(PORT, pages=PAGES, latency=0.2)
+
+    loader = SitemapLoader(SITEMAP_URL, filter_urls=[r"^(.*\/blog\/).*"])
+    loader.requests_per_second = 2
+    started_at = time.monotonic()
+    docs = loader.load()
+    print(f"SitemapLoader: {len(docs)} pages in {time.monotonic() - started_at:.2f}s")
+
+    for connections in (1, 4, 8):
+        crawler = SitemapCrawler(
+            filter_urls=[r"^(.*\/blog\/).*"], connections_per_host=connections
+        )
+        started_at = time.monotonic()
+        first_page_at = None
+        docs = []
+        for doc in runtime.iterate(crawler.crawl(SITEMAP_URL)):
+            first_page_at = first_page_at or time.monotonic() - started_at
+            docs.append(doc)
+        print(
+            f"crawler x{connections}: {len(docs)} pages in "
+            f"{time.monotonic() - started_at:.2f}s (first page {first_page_at:.2f}s)"
+        )
@@ -0,0 +1,54 @@
+"""Compare serial embedding with the batched scheduler against the fake server.
+
+    python benchmarks/embedding_throughput.py
+"""
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.embeddings import OpenAIEmbeddings
+
+from benchmarks.fake_embeddings_server import serve
+from core.embeddings import BatchedEmbeddings, RateLimiter
+from core.splitter import get_splitter
+
+PORT = 8765
+
+
+def load_texts():
+    splitter = get_splitter(separator="\n", chunk_size=600, chunk_overlap=100)
+    texts = []
+    for path in sorted(glob.glob("./files/*.txt")):
+        with open(path, encoding="utf-8") as f:
+            texts.extend(splitter.split_text(f.read()))
+    return texts
+
+
+if __name__ == "__main__":
+    serve(PORT, latency=0.3, requests_per_minute=300)
+    embeddings = OpenAIEmbeddings(
+        openai_api_base=f"http://127.0.0.1:{PORT}/v1",
+        openai_api_key="fake",
+        chunk_size=16,
+        max_retries=0,
+    )
+    texts = load_texts()
+
+    started_at = time.monotonic()
+    embeddings.embed_documents(texts)
+    print(f"serial:  {len(texts)} texts in {time.monotonic() - started_at:.2f}s")
+
+    batched = BatchedEmbeddings(
+        embeddings,
+        limiter=RateLimiter(requests_per_minute=300, tokens_per_minute=1_000_000),
+        batch_tokens=8000,
+        batch_size=16,
+        max_concurrency=8,
+    )
+    started_at = time.monotonic()
+    batched.embed_documents(texts)
+    print(f"batched: {len(texts)} texts in {time.monotonic() - started_at:.2f}s")
+    print(batched.throughput())
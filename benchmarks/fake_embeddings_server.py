@@ -0,0 +1,103 @@
+"""OpenAI-compatible /embeddings endpoint for exercising the embedding scheduler.
+
+    python benchmarks/fake_embeddings_server.py --port 8765 --latency 0.3 --rpm 600
+
+``Handler.requests`` records ``(time, status)`` for every request it answers.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIMENSIONS = 1536
+
+
+def fake_vector(value):
+    seed = hashlib.sha256(json.dumps(value).encode()).digest()
+    return [((seed[i % len(seed)] + i) % 255) / 255 for i in range(DIMENSIONS)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    latency = 0.0
+    requests_per_minute = 0
+    # requests_per_minute를 세는 구간(초); 테스트에서는 짧게 줄인다
+    period = 60.0
+    calls = []
+    requests = []
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def rate_limited(self):
+        if not self.requests_per_minute:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            self.calls[:] = [t for t in self.calls if now - t < self.period]
+            if len(self.calls) >= self.requests_per_minute:
+                return True
+            self.calls.append(now)
+        return False
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        with self.lock:
+            self.requests.append((time.monotonic(), status))
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.rate_limited():
+            self.send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}})
+            return
+        time.sleep(self.latency)
+        inputs = body["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        data = []
+        for i, value in enumerate(inputs):
+            vector = fake_vector(value)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"{len(vector)}f", *vector)).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        self.send_json(
+            200,
+            {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "fake"),
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            },
+        )
+
+
+def serve(port=8765, latency=0.0, requests_per_minute=0, period=60.0):
+    Handler.latency = latency
+    Handler.requests_per_minute = requests_per_minute
+    Handler.period = period
+    Handler.calls = []
+    Handler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--rpm", type=int, default=0)
+    args = parser.parse_args()
+    serve(args.port, args.latency, args.rpm)
+    print(f"Serving fake embeddings on http://127.0.0.1:{args.port}/v1")
+    threading.Event().wait()
@@ -0,0 +1,125 @@
+"""Local docs site with a sitemap, robots.txt and slow pages for the crawler.
+
+    python benchmarks/fake_site_server.py --port 8766 --pages 200 --latency 0.2
+
+``Handler.requests`` records ``(time, path, status)`` for every request.
+"""
+import argparse
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE = """<html><head><title>Post {number}</title></head><body>
+<header><nav>Home | Blog | Docs</nav></header>
+<main><h1>Post {number}</h1>{paragraphs}</main>
+<footer>Copyright</footer>
+</body></html>"""
+
+
+def sitemap(base_url, pages, lastmod="2023-11-01"):
+    lastmod = f"<lastmod>{lastmod}</lastmod>" if lastmod else ""
+    urls = "".join(
+        f"<url><loc>{base_url}/blog/post-{number}</loc>{lastmod}</url>"
+        for number in range(pages)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        f"{urls}</urlset>"
+    )
+
+
+def page(number):
+    paragraphs = "".join(
+        f"<p>Paragraph {i} of post {number}. {'Lorem ipsum dolor sit amet. ' * 20}</p>"
+        for i in range(10)
+    )
+    return PAGE.format(number=number, paragraphs=paragraphs)
+
+
+class Handler(BaseHTTPRequestHandler):
+    pages = 200
+    latency = 0.0
+    crawl_delay = 0.0
+    disallow = ""
+    lastmod = "2023-11-01"
+    requests = []
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def record(self, status):
+        with self.lock:
+            self.requests.append((time.monotonic(), self.path, status))
+
+    def send_text(self, status, body, content_type, etag=None):
+        payload = body.encode()
+        self.record(status)
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        base_url = f"http://{self.headers['Host']}"
+        if self.path == "/robots.txt":
+            rules = ["User-agent: *"]
+            if self.crawl_delay:
+                # robotparser는 정수 Crawl-delay만 읽는다
+                rules.append(f"Crawl-delay: {self.crawl_delay:g}")
+            if self.disallow:
+                rules.append(f"Disallow: {self.disallow}")
+            self.send_text(200, "\n".join(rules) + "\n", "text/plain")
+        elif self.path == "/sitemap.xml":
+            self.send_text(
+                200, sitemap(base_url, self.pages, self.lastmod), "application/xml"
+            )
+        elif self.path.startswith("/blog/post-"):
+            number = int(self.path.rsplit("-", 1)[1])
+            if number >= self.pages:
+                self.send_text(404, "Not found", "text/plain")
+                return
+            time.sleep(self.latency)
+            body = page(number)
+            etag = f'"{hashlib.sha256(body.encode()).hexdigest()[:16]}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.record(304)
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_text(200, body, "text/html", etag=etag)
+        else:
+            self.send_text(404, "Not found", "text/plain")
+
+
+def serve(
+    port=8766, pages=200, latency=0.0, crawl_delay=0.0, disallow="", lastmod="2023-11-01"
+):
+    Handler.pages = pages
+    Handler.latency = latency
+    Handler.crawl_delay = crawl_delay
+    Handler.disallow = disallow
+    Handler.lastmod = lastmod
+    Handler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--crawl-delay", type=float, default=0.0)
+    args = parser.parse_args()
+    serve(args.port, args.pages, args.latency, args.crawl_delay)
+    print(f"Serving fake site on http://127.0.0.1:{args.port}/sitemap.xml")
+    threading.Event().wait()
@@ -0,0 +1,56 @@
+"""Time HTML-to-text extraction backends over the saved HTML fixtures.
+
+    python benchmarks/html_extraction.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from core.extract import Extractor
+
+FIXTURES = ["case1.html", "case2.html"]
+ROUNDS = 50
+
+
+def parse_page(html, url=""):
+    # 예전 SiteGPT의 parse_page
+    soup = BeautifulSoup(html, "html.parser")
+    header = soup.find("header")
+    footer = soup.find("footer")
+    if header:
+        header.decompose()
+    if footer:
+        footer.decompose()
+    return (
+        str(soup.get_text())
+        .replace("\n", " ")
+        .replace("\xa0", " ")
+        .replace("CloseSearch Submit Blog", "")
+    )
+
+
+if __name__ == "__main__":
+    pages = {}
+    for path in FIXTURES:
+        with open(path, encoding="utf-8") as f:
+            pages[path] = f.read()
+    extractors = {
+        "parse_page": parse_page,
+        "bs4": Extractor(backend="bs4"),
+        "lxml": Extractor(backend="lxml"),
+        "lxml (no main detection)": Extractor(backend="lxml", main_content=False),
+    }
+    for name, extract in extractors.items():
+        for path, html in pages.items():
+            started_at = time.perf_counter()
+            for _ in range(ROUNDS):
+                text = extract(html)
+            elapsed = (time.perf_counter() - started_at) / ROUNDS
+            print(
+                f"{name:>26} {path}: {elapsed * 1000:7.2f} ms/page, "
+                f"{len(text):6d} chars"
+            )
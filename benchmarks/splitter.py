@@ -0,0 +1,62 @@
+"""Shared token splitter against LangChain's from_tiktoken_encoder splitter.
+
+    python benchmarks/splitter.py --repeat 5
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.text_splitter import CharacterTextSplitter
+
+from core.splitter import SPLITTER_ENCODING, TokenCharacterTextSplitter, token_length
+
+
+def load_texts():
+    texts = []
+    for path in sorted(glob.glob("./files/*.txt")):
+        with open(path, encoding="utf-8") as f:
+            texts.append(f.read())
+    return texts
+
+
+def run(make_splitter, texts, repeat):
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        chunks = [chunk for text in texts for chunk in make_splitter().split_text(text)]
+    return chunks, (time.perf_counter() - started_at) / repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    # 두 splitter가 같은 토크나이저로 세어야 청크 비교가 의미 있다
+    settings = {
+        "encoding_name": SPLITTER_ENCODING,
+        "separator": "\n",
+        "chunk_size": 600,
+        "chunk_overlap": 100,
+    }
+    texts = load_texts()
+
+    expected, baseline = run(
+        lambda: CharacterTextSplitter.from_tiktoken_encoder(**settings),
+        texts,
+        args.repeat,
+    )
+    splitter = TokenCharacterTextSplitter(**settings)
+
+    def shared():
+        # 반복마다 길이 캐시를 비워서 캐시가 빈 상태의 속도를 잰다
+        token_length.cache_clear()
+        return splitter
+
+    chunks, elapsed = run(shared, texts, args.repeat)
+    print(f"{len(texts)} files, {sum(map(len, texts))} characters")
+    print(f"from_tiktoken_encoder: {baseline * 1000:.1f}ms, {len(expected)} chunks")
+    print(f"shared splitter:       {elapsed * 1000:.1f}ms, {len(chunks)} chunks")
+    print(f"identical chunks: {chunks == expected}")
@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class AnswerCache:
+    """Answers keyed by document and question embedding.
+
+    A question hits when an earlier question about the same document has a
+    cosine similarity of at least ``threshold``. Entries expire after ``ttl``
+    seconds and the least recently used ones are dropped past ``max_entries``.
+    """
+
+    def __init__(self, threshold=0.95, ttl=24 * 3600, max_entries=2000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.by_document = {}
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _drop(self, entry_id):
+        document_key, _, _, _ = self.entries.pop(entry_id)
+        ids = self.by_document[document_key]
+        ids.remove(entry_id)
+        if not ids:
+            del self.by_document[document_key]
+
+    def lookup(self, document_key, vector):
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        now = time.time()
+        with self.lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self.by_document.get(document_key, [])):
+                _, entry_vector, answer, created_at = self.entries[entry_id]
+                if now - created_at > self.ttl:
+                    self._drop(entry_id)
+                    continue
+                score = float(entry_vector @ query)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(best_id)
+            return self.entries[best_id][2]
+
+    def store(self, document_key, vector, answer):
+        vector = np.asarray(vector, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        with self.lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            self.entries[entry_id] = (document_key, vector, answer, time.time())
+            self.by_document.setdefault(document_key, []).append(entry_id)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_answer_cache(name, **options):
+    """Process-wide cache so every session shares the same answers."""
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = AnswerCache(**options)
+        return _caches[name]
@@ -0,0 +1,167 @@
+import weakref
+
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain.vectorstores.faiss import FAISS
+
+from core.index_cache import estimate_size
+from core.vectorstore import (
+    can_merge,
+    copy_index,
+    index_vectors,
+    rebuild_index,
+    renumbers_on_remove,
+)
+
+
+class DocumentCollection:
+    """A session-wide FAISS index that grows and shrinks one file at a time.
+
+    Files are merged in from their own persisted index, so nothing is
+    re-embedded. Removed files are tombstoned and filtered out at search time
+    until enough of them pile up to be worth compacting away.
+
+    The merged index is this session's own copy. Passing the shared
+    ``IndexCache`` as ``cache`` counts its size against the cache's budget.
+    """
+
+    def __init__(self, compact_ratio=0.3, cache=None):
+        self.compact_ratio = compact_ratio
+        self.cache = cache
+        if cache is not None:
+            weakref.finalize(self, cache.release, id(self))
+        self.vectorstore = None
+        self.names = {}
+        self.ids = {}
+        self.tombstones = set()
+        self.jobs = {}
+        self.failed = {}
+
+    def __contains__(self, digest):
+        if digest in self.jobs or digest in self.failed:
+            return True
+        return digest in self.names and digest not in self.tombstones
+
+    def start(self, job):
+        """Track an ingestion job; its partial index is searched until it finishes."""
+        self.jobs[job.digest] = job.start()
+
+    def poll(self):
+        for digest, job in list(self.jobs.items()):
+            if not job.done:
+                continue
+            del self.jobs[digest]
+            if job.error is not None:
+                self.failed[digest] = job
+            elif job.vectorstore is not None and not job.cancelled:
+                self.add(digest, job.name, job.vectorstore)
+
+    def pending(self):
+        return list(self.jobs.values())
+
+    def ready(self):
+        return self.count() > 0 or any(job.ready() for job in self.jobs.values())
+
+    def add(self, digest, name, vectorstore):
+        if digest in self.tombstones:
+            self.tombstones.discard(digest)
+            self.names[digest] = name
+            return
+        if digest in self.names:
+            return
+        # 공유 캐시의 인덱스는 건드리지 않는다: faiss merge_from은 원본을 비운다
+        copy = FAISS(
+            vectorstore.embedding_function,
+            copy_index(vectorstore.index),
+            InMemoryDocstore(dict(vectorstore.docstore._dict)),
+            dict(vectorstore.index_to_docstore_id),
+        )
+        if self.vectorstore is None:
+            self.vectorstore = copy
+        elif can_merge(self.vectorstore.index, copy.index):
+            self.vectorstore.merge_from(copy)
+        else:
+            # IVF·HNSW는 양자화기가 달라 합칠 수 없으니 복원한 벡터를 다시 넣는다
+            ids = [copy.index_to_docstore_id[i] for i in range(copy.index.ntotal)]
+            docs = [copy.docstore.search(id) for id in ids]
+            self.vectorstore.add_embeddings(
+                zip([doc.page_content for doc in docs], index_vectors(copy.index)),
+                [doc.metadata for doc in docs],
+                ids=ids,
+            )
+        self.names[digest] = name
+        self.ids[digest] = list(vectorstore.index_to_docstore_id.values())
+        self._reserve()
+
+    def remove(self, digest):
+        if digest in self.names:
+            self.tombstones.add(digest)
+            if self.tombstoned_count() > self.compact_ratio * self.count():
+                self.compact()
+
+    def retain(self, digests):
+        for digest in list(self.jobs):
+            if digest not in digests:
+                self.jobs.pop(digest).cancel()
+        for digest in list(self.failed):
+            if digest not in digests:
+                del self.failed[digest]
+        for digest in list(self.names):
+            if digest not in digests:
+                self.remove(digest)
+
+    def key(self):
+        """Identifies the set of documents currently searchable."""
+        digests = [digest for digest in self.names if digest not in self.tombstones]
+        return ",".join(sorted(digests))
+
+    def count(self):
+        return 0 if self.vectorstore is None else self.vectorstore.index.ntotal
+
+    def tombstoned_count(self):
+        return sum(len(self.ids[digest]) for digest in self.tombstones)
+
+    def compact(self):
+        removed = {id for digest in self.tombstones for id in self.ids[digest]}
+        if removed and renumbers_on_remove(self.vectorstore.index):
+            self.vectorstore.delete(list(removed))
+        elif removed:
+            # IVF·HNSW의 remove_ids는 번호를 당기지 않으니 남은 벡터로 인덱스를 다시 만든다
+            kept = [
+                (i, id)
+                for i, id in sorted(self.vectorstore.index_to_docstore_id.items())
+                if id not in removed
+            ]
+            vectors = index_vectors(self.vectorstore.index)[[i for i, _ in kept]]
+            self.vectorstore.index = rebuild_index(self.vectorstore.index, vectors)
+            self.vectorstore.docstore.delete(list(removed))
+            self.vectorstore.index_to_docstore_id = {
+                position: id for position, (_, id) in enumerate(kept)
+            }
+        for digest in self.tombstones:
+            del self.names[digest]
+            del self.ids[digest]
+        self.tombstones = set()
+        if self.count() == 0:
+            self.vectorstore = None
+        self._reserve()
+
+    def _reserve(self):
+        if self.cache is not None:
+            size = 0 if self.vectorstore is None else estimate_size(self.vectorstore)
+            self.cache.reserve(id(self), size)
+
+    def search(self, query, k=4):
+        results = []
+        if self.vectorstore is not None:
+            fetch_k = min(k + self.tombstoned_count(), self.count())
+            results = [
+                (doc, score)
+                for doc, score in self.vectorstore.similarity_search_with_score(
+                    query, k=fetch_k
+                )
+                if doc.metadata.get("content_hash") not in self.tombstones
+            ]
+        for job in self.jobs.values():
+            if job.ready():
+                results.extend(job.search(query, k=k))
+        return sorted(results, key=lambda result: result[1])[:k]
@@ -0,0 +1,80 @@
+from langchain.schema.runnable import RunnableLambda
+
+from core.tokens import count_tokens, get_encoding
+
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 4096,
+    "gpt-3.5-turbo-16k": 16385,
+    "gpt-3.5-turbo-1106": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-1106-preview": 128000,
+    "mistral:latest": 8192,
+}
+# 프롬프트, 질문, 답변이 쓸 토큰을 남겨 둔다
+RESERVED_TOKENS = 1500
+# 잘라서라도 넣을 만한 최소 길이
+MIN_TRUNCATED_TOKENS = 50
+
+
+def context_budget(model, reserved=RESERVED_TOKENS, max_tokens=None):
+    budget = MODEL_CONTEXT_WINDOWS.get(model, 4096) - reserved
+    return min(budget, max_tokens) if max_tokens else budget
+
+
+def _overlap(previous, text, min_chars=20):
+    """Length of the longest suffix of ``previous`` that starts ``text``."""
+    probe = text[:min_chars]
+    if len(probe) < min_chars:
+        return 0
+    start = previous.find(probe)
+    while start != -1:
+        if text.startswith(previous[start:]):
+            return len(previous) - start
+        start = previous.find(probe, start + 1)
+    return 0
+
+
+def _truncate(text, max_tokens):
+    encoding = get_encoding()
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def pack_context(docs_and_scores, max_tokens, separator="\n\n"):
+    """Join the most relevant chunks that fit in ``max_tokens``.
+
+    Chunks are taken best score first (FAISS scores are distances). Text a
+    chunk shares with an already chosen neighbour through the splitter's
+    overlap is cut, the first chunk that no longer fits is truncated, and
+    everything after it is dropped.
+    """
+    chosen = []
+    remaining = max_tokens
+    separator_tokens = count_tokens(separator)
+    for doc, _ in sorted(docs_and_scores, key=lambda result: result[1]):
+        text = doc.page_content
+        for previous in chosen:
+            text = text[_overlap(previous, text) :]
+            cut = _overlap(text, previous)
+            if cut:
+                text = text[:-cut]
+        text = text.strip()
+        if not text:
+            continue
+        tokens = count_tokens(text) + (separator_tokens if chosen else 0)
+        if tokens > remaining:
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                chosen.append(_truncate(text, remaining - separator_tokens))
+            break
+        chosen.append(text)
+        remaining -= tokens
+    return separator.join(chosen)
+
+
+def context_packer(search, model, k=8, max_tokens=None):
+    """Runnable mapping a question to packed context.
+
+    ``search(question, k)`` must return ``(document, score)`` pairs.
+    """
+    budget = context_budget(model, max_tokens=max_tokens)
+    return RunnableLambda(lambda question: pack_context(search(question, k), budget))
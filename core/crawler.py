@@ -0,0 +1,293 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+from bs4 import BeautifulSoup
+from langchain.schema import Document
+
+from core.extract import Extractor
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "SiteGPT"
+# 호스트 하나에 동시에 열어 둘 연결 수
+CONNECTIONS_PER_HOST = 4
+MAX_CONNECTIONS = 32
+REQUEST_TIMEOUT = 30
+
+
+class CrawlState:
+    """Per-page validators of a crawled site, persisted as JSON.
+
+    For every page we keep the sitemap ``lastmod``, the ``ETag`` and
+    ``Last-Modified`` response headers, the hash of the extracted text and the
+    ids of its chunks in the index, so a re-crawl only touches what changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = {}
+        self.crawled_at = None
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.pages = data["pages"]
+            self.crawled_at = data["crawled_at"]
+
+    def get(self, url):
+        return self.pages.get(url)
+
+    def urls(self):
+        return set(self.pages)
+
+    def update(self, url, **fields):
+        self.pages.setdefault(url, {}).update(
+            {key: value for key, value in fields.items() if value is not None}
+        )
+
+    def remove(self, url):
+        return self.pages.pop(url, None)
+
+    def conditional_headers(self, url):
+        page = self.pages.get(url) or {}
+        headers = {}
+        if page.get("etag"):
+            headers["If-None-Match"] = page["etag"]
+        if page.get("last_modified"):
+            headers["If-Modified-Since"] = page["last_modified"]
+        return headers
+
+    def save(self):
+        self.crawled_at = time.time()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": self.pages, "crawled_at": self.crawled_at}, f)
+        os.replace(tmp_path, self.path)
+
+
+class HostPolicy:
+    """robots.txt rules and request spacing for one host."""
+
+    def __init__(self, robots, connections, user_agent=USER_AGENT):
+        self.robots = robots
+        self.user_agent = user_agent
+        self.delay = 0.0
+        if robots is not None:
+            self.delay = float(robots.crawl_delay(user_agent) or 0)
+            rate = robots.request_rate(user_agent)
+            if rate and rate.requests:
+                self.delay = max(self.delay, rate.seconds / rate.requests)
+        self.semaphore = asyncio.Semaphore(connections)
+        self.lock = asyncio.Lock()
+        self.next_request = 0.0
+
+    def allowed(self, url):
+        return self.robots is None or self.robots.can_fetch(self.user_agent, url)
+
+    async def wait(self):
+        # crawl-delay가 있으면 연결 수와 상관없이 요청 간격을 지킨다
+        if not self.delay:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            if self.next_request > now:
+                await asyncio.sleep(self.next_request - now)
+            self.next_request = max(now, self.next_request) + self.delay
+
+
+class SitemapCrawler:
+    """Fetches every page of a sitemap concurrently on one pooled HTTP client.
+
+    Each host gets at most ``connections_per_host`` requests in flight and its
+    robots.txt rules and crawl-delay are honoured. Pages are yielded as
+    ``Document``s in the order they finish, so callers can split and embed
+    while the rest are still downloading.
+
+    With a ``CrawlState`` only changed pages are yielded: pages whose sitemap
+    ``lastmod`` is unchanged are not fetched, the others are requested
+    conditionally, and a page whose text hashes the same is dropped.
+    ``urls`` holds every page the sitemap listed, changed or not.
+
+    ``parsing_function`` is called with a page's HTML and URL and returns its
+    text; it defaults to an lxml ``Extractor``.
+    """
+
+    def __init__(
+        self,
+        filter_urls=None,
+        parsing_function=None,
+        connections_per_host=CONNECTIONS_PER_HOST,
+        max_connections=MAX_CONNECTIONS,
+        user_agent=USER_AGENT,
+        timeout=REQUEST_TIMEOUT,
+    ):
+        self.filter_urls = [re.compile(pattern) for pattern in filter_urls or []]
+        self.parsing_function = parsing_function or Extractor()
+        self.connections_per_host = connections_per_host
+        self.max_connections = max_connections
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.policies = {}
+        self.policies_lock = None
+        self.state = None
+        self.urls = set()
+
+    def _session(self):
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.connections_per_host,
+            ),
+            headers={"User-Agent": self.user_agent},
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+
+    def _wanted(self, url):
+        if not self.filter_urls:
+            return True
+        return any(pattern.match(url) for pattern in self.filter_urls)
+
+    async def _robots(self, session, url):
+        parts = urlparse(url)
+        robots = RobotFileParser(f"{parts.scheme}://{parts.netloc}/robots.txt")
+        try:
+            async with session.get(robots.url) as response:
+                if response.status in (401, 403):
+                    robots.disallow_all = True
+                    return robots
+                if response.status >= 400:
+                    return None
+                robots.parse((await response.text()).splitlines())
+                return robots
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            logger.warning("Could not read %s, crawling without it", robots.url)
+            return None
+
+    async def _policy(self, session, url):
+        host = urlparse(url).netloc
+        async with self.policies_lock:
+            if host not in self.policies:
+                self.policies[host] = HostPolicy(
+                    await self._robots(session, url),
+                    self.connections_per_host,
+                    self.user_agent,
+                )
+            return self.policies[host]
+
+    async def _request(self, session, url, headers=None):
+        """GET ``url`` within its host's limits.
+
+        Returns ``(headers, text)`` with ``text`` set to ``None`` on a 304, or
+        ``None`` when robots.txt disallows the URL.
+        """
+        policy = await self._policy(session, url)
+        if not policy.allowed(url):
+            logger.info("robots.txt disallows %s", url)
+            return None
+        async with policy.semaphore:
+            await policy.wait()
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    return response.headers, None
+                response.raise_for_status()
+                return response.headers, await response.text()
+
+    async def _get(self, session, url):
+        result = await self._request(session, url)
+        return result and result[1]
+
+    async def sitemap_entries(self, session, sitemap_url):
+        """``<url>`` entries of a sitemap as dicts, following sitemap indexes."""
+        text = await self._get(session, sitemap_url)
+        if text is None:
+            return []
+        soup = BeautifulSoup(text, "xml")
+        nested = [
+            urljoin(sitemap_url, loc.text.strip())
+            for sitemap in soup.find_all("sitemap")
+            if (loc := sitemap.find("loc"))
+        ]
+        entries = []
+        for url in soup.find_all("url"):
+            loc = url.find("loc")
+            if loc is None or not self._wanted(loc.text.strip()):
+                continue
+            entry = {"loc": loc.text.strip()}
+            for tag in ("lastmod", "changefreq", "priority"):
+                if url.find(tag):
+                    entry[tag] = url.find(tag).text.strip()
+            entries.append(entry)
+        for results in await asyncio.gather(
+            *(self.sitemap_entries(session, url) for url in nested)
+        ):
+            entries.extend(results)
+        return entries
+
+    async def _fetch_page(self, session, entry):
+        url = entry["loc"]
+        page = self.state.get(url) if self.state else None
+        # sitemap의 lastmod가 그대로면 요청조차 보내지 않는다
+        if page and entry.get("lastmod") and entry["lastmod"] == page.get("lastmod"):
+            return None
+        headers = self.state.conditional_headers(url) if page else None
+        try:
+            result = await self._request(session, url, headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("Fetching %s failed: %s", url, e)
+            return None
+        if result is None:
+            return None
+        response_headers, html = result
+        validators = {
+            "lastmod": entry.get("lastmod"),
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+        }
+        if html is None:
+            self.state.update(url, **validators)
+            return None
+        # 파싱은 CPU를 쓰니 이벤트 루프 밖에서 돌려 다른 요청이 멈추지 않게 한다
+        text = await asyncio.get_running_loop().run_in_executor(
+            None, self.parsing_function, html, url
+        )
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        if page and page.get("content_hash") == digest:
+            self.state.update(url, **validators)
+            return None
+        metadata = {"source": url, **entry, "content_hash": digest}
+        metadata.update(
+            {key: value for key, value in validators.items() if value is not None}
+        )
+        return Document(page_content=text, metadata=metadata)
+
+    async def crawl(self, sitemap_url, state=None):
+        """Yield one ``Document`` per sitemap page as soon as it is parsed.
+
+        With ``state`` only new or changed pages are yielded.
+        """
+        self.policies_lock = asyncio.Lock()
+        self.state = state
+        self.urls = set()
+        async with self._session() as session:
+            entries = await self.sitemap_entries(session, sitemap_url)
+            self.urls = {entry["loc"] for entry in entries}
+            tasks = [
+                asyncio.ensure_future(self._fetch_page(session, entry))
+                for entry in entries
+            ]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    doc = await task
+                    if doc is not None:
+                        yield doc
+            finally:
+                for task in tasks:
+                    task.cancel()
@@ -0,0 +1,323 @@
+import logging
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import List
+
+from langchain.embeddings import OpenAIEmbeddings
+from langchain.schema.embeddings import Embeddings
+
+from core.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token buckets for requests-per-minute and tokens-per-minute budgets."""
+
+    def __init__(self, requests_per_minute=3000, tokens_per_minute=1_000_000):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = float(requests_per_minute)
+        self.tokens = float(tokens_per_minute)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.requests = min(
+            self.requests_per_minute,
+            self.requests + elapsed * self.requests_per_minute / 60,
+        )
+        self.tokens = min(
+            self.tokens_per_minute,
+            self.tokens + elapsed * self.tokens_per_minute / 60,
+        )
+
+    def acquire(self, tokens):
+        # 한 배치가 분당 토큰 한도보다 크면 영원히 기다리게 되니 한도로 자른다
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.requests >= 1 and self.tokens >= tokens:
+                    self.requests -= 1
+                    self.tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self.requests) * 60 / self.requests_per_minute,
+                    (tokens - self.tokens) * 60 / self.tokens_per_minute,
+                )
+            time.sleep(max(wait, 0.01))
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name, requests_per_minute=3000, tokens_per_minute=1_000_000):
+    """Process-wide limiter so every session shares one budget per backend."""
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return _limiters[name]
+
+
+def _without_retries(embeddings):
+    """The client that actually sends requests, with its own retries turned off.
+
+    Retries from inside the client would multiply with the scheduler's and
+    skip the rate limiter, so only the scheduler is allowed to retry.
+    """
+    if isinstance(embeddings, CachedQueryEmbeddings):
+        embeddings = embeddings.embeddings
+    if not getattr(embeddings, "max_retries", 0):
+        return embeddings
+    if not hasattr(embeddings, "copy"):
+        raise ValueError(
+            f"{type(embeddings).__name__} retries on its own; "
+            "pass it with max_retries=0"
+        )
+    return embeddings.copy(update={"max_retries": 0})
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeds documents in token-bounded batches, several batches at a time."""
+
+    def __init__(
+        self,
+        embeddings,
+        limiter=None,
+        batch_tokens=8000,
+        batch_size=500,
+        max_concurrency=4,
+        max_retries=6,
+        backoff=1.0,
+        max_backoff=60.0,
+    ):
+        self.embeddings = embeddings
+        self.document_embeddings = _without_retries(embeddings)
+        self.limiter = limiter or RateLimiter()
+        self.batch_tokens = batch_tokens
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = {"texts": 0, "tokens": 0, "requests": 0, "retries": 0, "seconds": 0.0}
+        self.stats_lock = threading.Lock()
+
+    def make_batches(self, texts):
+        batches = []
+        batch, batch_tokens = [], 0
+        for text in texts:
+            tokens = count_tokens(text)
+            if batch and (
+                batch_tokens + tokens > self.batch_tokens
+                or len(batch) >= self.batch_size
+            ):
+                batches.append((batch, batch_tokens))
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append((batch, batch_tokens))
+        return batches
+
+    def _embed_batch(self, batch):
+        texts, tokens = batch
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(tokens)
+            try:
+                vectors = self.document_embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                wait = min(self.max_backoff, self.backoff * 2**attempt)
+                wait += random.uniform(0, wait / 2)
+                logger.warning("Embedding batch failed (%s), retrying in %.1fs", e, wait)
+                with self.stats_lock:
+                    self.stats["retries"] += 1
+                time.sleep(wait)
+                continue
+            with self.stats_lock:
+                self.stats["requests"] += 1
+                self.stats["texts"] += len(texts)
+                self.stats["tokens"] += tokens
+            return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        started_at = time.monotonic()
+        batches = self.make_batches(texts)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            results = list(executor.map(self._embed_batch, batches))
+        with self.stats_lock:
+            self.stats["seconds"] += time.monotonic() - started_at
+        logger.info("Embedded %d texts in %d batches: %s", len(texts), len(batches), self.throughput())
+        return [vector for vectors in results for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def throughput(self):
+        seconds = self.stats["seconds"] or 1e-9
+        return {
+            **self.stats,
+            "texts_per_second": self.stats["texts"] / seconds,
+            "tokens_per_second": self.stats["tokens"] / seconds,
+        }
+
+
+class _QueryBatcher:
+    """Groups queries that arrive within ``window`` seconds into one request."""
+
+    def __init__(self, embed_batch, window=0.01, max_batch=64):
+        self.embed_batch = embed_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, text):
+        with self.lock:
+            # 같은 질문이 동시에 들어오면 하나의 요청 결과를 나눠 쓴다
+            if text in self.inflight:
+                return self.inflight[text]
+            future = Future()
+            self.inflight[text] = future
+        self.queue.put(text)
+        return future
+
+    def _run(self):
+        while True:
+            texts = [self.queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(texts) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    texts.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                vectors = self.embed_batch(texts)
+            except Exception as e:
+                vectors, error = None, e
+            with self.lock:
+                futures = [self.inflight.pop(text) for text in texts]
+            for i, future in enumerate(futures):
+                if vectors is None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(vectors[i])
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """LRU/TTL cache for query embeddings, with concurrent misses batched.
+
+    Batching is only used when the backend embeds queries and documents the
+    same way (OpenAI); other backends are called once per missed query on a
+    small thread pool. Either way, identical queries in flight share one
+    request.
+    """
+
+    def __init__(self, embeddings, max_entries=10000, ttl=3600, window=0.01):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.batcher = None
+        self.executor = None
+        if isinstance(embeddings, OpenAIEmbeddings):
+            self.batcher = _QueryBatcher(embeddings.embed_documents, window=window)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=4)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def submit(self, text):
+        """A future for the vector of ``text``, shared with the same query in flight."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(text)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self.entries.move_to_end(text)
+                self.hits += 1
+                future = Future()
+                future.set_result(entry[0])
+                return future
+            if text in self.pending:
+                return self.pending[text]
+            self.misses += 1
+            if self.batcher is not None:
+                future = self.batcher.submit(text)
+            else:
+                future = self.executor.submit(self.embeddings.embed_query, text)
+            self.pending[text] = future
+        future.add_done_callback(lambda future: self._finish(text, future, now))
+        return future
+
+    def _finish(self, text, future, now):
+        with self.lock:
+            self.pending.pop(text, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            self.entries[text] = (future.result(), now)
+            self.entries.move_to_end(text)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+
+_query_executor = ThreadPoolExecutor(max_workers=4)
+
+
+def submit_query(embeddings, text):
+    """A future for ``embeddings.embed_query(text)``."""
+    if isinstance(embeddings, CachedQueryEmbeddings):
+        return embeddings.submit(text)
+    return _query_executor.submit(embeddings.embed_query, text)
+
+
+def embed_query_within(embeddings, text, timeout):
+    """``embeddings.embed_query(text)``, or ``None`` if it takes over ``timeout``.
+
+    The request keeps running after a timeout, and a later call for the same
+    text on ``CachedQueryEmbeddings`` waits on it instead of sending another.
+    """
+    try:
+        return submit_query(embeddings, text).result(timeout=timeout)
+    except FutureTimeoutError:
+        return None
+
+
+_query_embeddings = {}
+_query_embeddings_lock = threading.Lock()
+
+
+def get_query_embeddings(name, embeddings):
+    """Process-wide query cache per backend, shared by every session."""
+    if isinstance(embeddings, CachedQueryEmbeddings):
+        return embeddings
+    with _query_embeddings_lock:
+        if name not in _query_embeddings:
+            _query_embeddings[name] = CachedQueryEmbeddings(embeddings)
+        return _query_embeddings[name]
@@ -0,0 +1,177 @@
+import re
+from urllib.parse import urlparse
+
+import lxml.html
+from bs4 import BeautifulSoup
+from lxml.etree import ParserError
+
+# 어느 사이트에서나 본문이 아닌 요소
+BOILERPLATE_TAGS = [
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "svg",
+    "iframe",
+    "header",
+    "footer",
+    "nav",
+    "aside",
+    "form",
+]
+BOILERPLATE_XPATH = [
+    "//*[@role='navigation' or @role='banner' or @role='contentinfo']",
+    "//*[@aria-hidden='true']",
+]
+MAIN_XPATH = ["//main", "//article", "//*[@role='main']"]
+BLOCK_TAGS = [
+    "p",
+    "div",
+    "section",
+    "li",
+    "tr",
+    "br",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "pre",
+    "blockquote",
+    "table",
+]
+
+# 호스트별 규칙: remove는 더 지울 XPath, main은 본문 XPath, strip은 지울 문구
+SITE_RULES = {
+    "openai.com": {
+        "strip": ["CloseSearch Submit Blog"],
+    },
+}
+
+# 자동으로 고른 본문이 전체 글자의 이만큼도 못 담으면 페이지 전체를 쓴다
+MIN_MAIN_RATIO = 0.25
+
+_SPACES = re.compile(r"[ \t\r\f\v\xa0]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+_HTML_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+
+
+def site_rules(url, rules=None):
+    host = urlparse(url).netloc.split(":")[0]
+    rules = SITE_RULES if rules is None else rules
+    for rule_host, rule in rules.items():
+        if host == rule_host or host.endswith(f".{rule_host}"):
+            return rule
+    return {}
+
+
+def normalize_text(text):
+    lines = (_SPACES.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def _drop(elements):
+    for element in elements:
+        if element.getparent() is not None:
+            element.drop_tree()
+
+
+def _densest(root):
+    """The element whose paragraphs hold the most non-link text.
+
+    Each element's own text is credited to its parent in full and to its
+    grandparent by half, so the container of the article body wins over
+    navigation lists and the ``<body>`` wrapping everything. Only elements
+    inside ``root`` are candidates.
+    """
+    scores = {}
+    for element in root.iter():
+        if not isinstance(element.tag, str) or element.tag == "a":
+            continue
+        length = len((element.text or "").strip())
+        length += sum(
+            len((child.tail or "").strip())
+            for child in element
+            if isinstance(child.tag, str)
+        )
+        if not length:
+            continue
+        if element is root:
+            scores[root] = scores.get(root, 0) + length
+            continue
+        parent = element.getparent()
+        scores[parent] = scores.get(parent, 0) + length
+        if parent is not root:
+            grandparent = parent.getparent()
+            scores[grandparent] = scores.get(grandparent, 0) + length / 2
+    if not scores:
+        return root
+    return max(scores, key=scores.get)
+
+
+def lxml_text(html, rules, main_content=True):
+    try:
+        root = lxml.html.fromstring(
+            html.encode() if isinstance(html, str) else html, parser=_HTML_PARSER
+        )
+    except ParserError:
+        return ""
+    _drop(root.xpath("|".join(f"//{tag}" for tag in BOILERPLATE_TAGS)))
+    for xpath in BOILERPLATE_XPATH + rules.get("remove", []):
+        _drop(root.xpath(xpath))
+    body = root.find("body")
+    body = root if body is None else body
+    main = body
+    for xpath in rules.get("main", []) + MAIN_XPATH:
+        found = root.xpath(xpath)
+        if found:
+            main = max(found, key=lambda element: len(element.text_content()))
+            break
+    else:
+        if main_content:
+            densest = _densest(body)
+            total = len(body.text_content())
+            if len(densest.text_content()) >= total * MIN_MAIN_RATIO:
+                main = densest
+    # text_content는 블록 사이를 붙여 버리니 줄바꿈을 넣어 둔다
+    for element in main.iter(*BLOCK_TAGS):
+        element.tail = "\n" + (element.tail or "")
+    return main.text_content()
+
+
+def bs4_text(html, rules, main_content=True):
+    soup = BeautifulSoup(html, "lxml")
+    for element in soup.find_all(BOILERPLATE_TAGS):
+        element.decompose()
+    main = soup.find(["main", "article"]) if main_content else None
+    return (main or soup).get_text("\n")
+
+
+BACKENDS = {
+    "lxml": lxml_text,
+    "bs4": bs4_text,
+}
+
+
+class Extractor:
+    """Turns a page's HTML into plain text for splitting.
+
+    ``backend`` names an entry of ``BACKENDS``. The lxml backend drops
+    boilerplate elements, applies the page host's ``SITE_RULES`` XPaths and,
+    unless a ``<main>``/``<article>`` is present, keeps the densest block of
+    text. The BeautifulSoup backend is the slower reference implementation
+    and only honours the tag list and ``strip`` phrases.
+    """
+
+    def __init__(self, backend="lxml", rules=None, main_content=True):
+        self.extract = BACKENDS[backend]
+        self.rules = rules
+        self.main_content = main_content
+
+    def __call__(self, html, url=""):
+        rules = site_rules(url, self.rules)
+        text = self.extract(html, rules, self.main_content)
+        for phrase in rules.get("strip", []):
+            text = text.replace(phrase, "")
+        return normalize_text(text)
@@ -0,0 +1,98 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """Rough bytes held by a cached index, lexical index or chunk list."""
+    index = getattr(value, "index", None)
+    if index is not None:
+        try:
+            code_size = index.sa_code_size()
+        except RuntimeError:
+            code_size = index.d * 4
+        docstore = getattr(value.docstore, "_dict", {})
+        return index.ntotal * code_size + sum(
+            len(doc.page_content) for doc in docstore.values()
+        )
+    postings = getattr(value, "postings", None)
+    if postings is not None:
+        return sum(
+            len(term) + positions.itemsize * len(positions) * 2
+            for term, (positions, _) in postings.items()
+        )
+    if isinstance(value, list):
+        return sum(len(getattr(item, "page_content", "")) for item in value)
+    return sys.getsizeof(value)
+
+
+class IndexCache:
+    """LRU cache of built indexes bounded by an estimated memory budget.
+
+    Memory held outside the cache, such as each session's merged collection,
+    can be ``reserve``d: it is never evicted, but counts against the budget
+    so cached entries make room for it.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.reserved = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def put(self, key, value, size=None):
+        size = estimate_size(value) if size is None else size
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            # 방금 넣은 항목은 예산을 넘더라도 남겨 둔다
+            self._evict(keep=1)
+        return value
+
+    def reserve(self, owner, size):
+        """Count ``size`` bytes held by ``owner`` outside the cache."""
+        with self.lock:
+            self.reserved[owner] = size
+            self._evict()
+
+    def release(self, owner):
+        with self.lock:
+            self.reserved.pop(owner, None)
+
+    def _evict(self, keep=0):
+        reserved = sum(self.reserved.values())
+        while self.bytes + reserved > self.max_bytes and len(self.entries) > keep:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "reserved_bytes": sum(self.reserved.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
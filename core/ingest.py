@@ -0,0 +1,419 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import faiss
+from langchain.document_loaders import UnstructuredFileLoader
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.vectorstores.faiss import FAISS
+
+from core.embeddings import (
+    BatchedEmbeddings,
+    get_query_embeddings,
+    get_rate_limiter,
+)
+from core.index_cache import IndexCache
+from core.lexical import HybridSearch, LexicalIndex
+from core.loaders import file_parts, load_files, stream_file
+from core.quantize import quantized_cache_embeddings
+from core.stores import open_byte_store
+from core.vectorstore import (
+    build_vectorstore,
+    load_vectorstore,
+    recall_at_k,
+    save_vectorstore,
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "./.cache"
+EMBEDDING_CACHE_BYTES = 2 * 1024**3
+# 진행형 인덱싱에서 이만큼 청크가 검색 가능해지면 질문을 받기 시작한다
+READY_AFTER = 50
+# 진행형 인덱싱에서 한 번에 임베딩에 넘기는 청크 수와 동시에 보내는 묶음 수
+INGEST_BATCH = 256
+INGEST_WORKERS = 2
+
+# 캐시된 인덱스와 세션마다 합친 컬렉션(reserve)을 함께 이 예산으로 센다
+INDEX_CACHE_BYTES = 1024**3
+
+# 같은 프로세스 안에서 페이지끼리 공유하는 청크와 인덱스
+cache = IndexCache(INDEX_CACHE_BYTES)
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def splitter_key(chunk_size=600, chunk_overlap=100, separator="\n"):
+    return f"{chunk_size}-{chunk_overlap}-{separator.encode().hex()}"
+
+
+def save_content(content, name):
+    """Store the upload under its content hash so renamed copies share one file."""
+    digest = content_hash(content)
+    extension = os.path.splitext(name)[1].lower()
+    folder = f"{CACHE_DIR}/uploads"
+    os.makedirs(folder, exist_ok=True)
+    file_path = f"{folder}/{digest}{extension}"
+    if not os.path.exists(file_path):
+        with open(file_path, "wb") as f:
+            f.write(content)
+    return digest, file_path
+
+
+def _cached_chunks(key):
+    docs = cache.get(f"chunks/{key}")
+    if docs is not None:
+        return docs
+    chunks_path = f"{CACHE_DIR}/chunks/{key}.pkl"
+    if os.path.exists(chunks_path):
+        with open(chunks_path, "rb") as f:
+            return cache.put(f"chunks/{key}", pickle.load(f))
+    return None
+
+
+def _save_chunks(key, docs):
+    folder = f"{CACHE_DIR}/chunks"
+    os.makedirs(folder, exist_ok=True)
+    with open(f"{folder}/{key}.pkl", "wb") as f:
+        pickle.dump(docs, f)
+    cache.put(f"chunks/{key}", docs)
+
+
+def split_files(
+    items,
+    loader_cls=UnstructuredFileLoader,
+    chunk_size=600,
+    chunk_overlap=100,
+    separator="\n",
+):
+    """Yield ``(digest, docs)`` for each ``(digest, file_path)`` in order.
+
+    Files whose chunks are already cached are not parsed again; the rest are
+    parsed in parallel on the loader process pool.
+    """
+    suffix = splitter_key(chunk_size, chunk_overlap, separator)
+    cached = {digest: _cached_chunks(f"{digest}-{suffix}") for digest, _ in items}
+    loaded = load_files(
+        [file_path for digest, file_path in items if cached[digest] is None],
+        loader_cls=loader_cls,
+        separator=separator,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+    for digest, _ in items:
+        docs = cached[digest]
+        if docs is None:
+            _, docs = next(loaded)
+            for doc in docs:
+                doc.metadata["content_hash"] = digest
+            _save_chunks(f"{digest}-{suffix}", docs)
+        yield digest, docs
+
+
+def split_file(
+    file_path,
+    digest,
+    loader_cls=UnstructuredFileLoader,
+    chunk_size=600,
+    chunk_overlap=100,
+    separator="\n",
+):
+    _, docs = next(
+        split_files(
+            [(digest, file_path)],
+            loader_cls=loader_cls,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separator=separator,
+        )
+    )
+    return docs
+
+
+def cache_backed_embeddings(embeddings, namespace, quantization=None):
+    # 임베딩 캐시 키는 청크 텍스트 해시라서 파일 이름과 무관하게 재사용된다
+    cache_store = open_byte_store(
+        f"{CACHE_DIR}/embeddings/{namespace}.sqlite", max_bytes=EMBEDDING_CACHE_BYTES
+    )
+    batched_embeddings = BatchedEmbeddings(
+        get_query_embeddings(namespace, embeddings),
+        limiter=get_rate_limiter(namespace),
+    )
+    if quantization:
+        return quantized_cache_embeddings(batched_embeddings, cache_store, quantization)
+    return CacheBackedEmbeddings.from_bytes_store(batched_embeddings, cache_store)
+
+
+def _index_key(digest, namespace, key="", quantization=None):
+    index_key = f"{namespace}/{digest}-{key}"
+    if quantization:
+        index_key += f"-{quantization}"
+    return index_key
+
+
+def find_vectorstore(digest, embeddings, namespace, key="", quantization=None):
+    """Return an already built index for this content, from memory or disk."""
+    index_key = _index_key(digest, namespace, key, quantization)
+    vectorstore = cache.get(f"indexes/{index_key}")
+    if vectorstore is None:
+        vectorstore = load_vectorstore(
+            f"{CACHE_DIR}/indexes/{index_key}",
+            cache_backed_embeddings(embeddings, namespace, quantization),
+        )
+        if vectorstore is not None:
+            cache.put(f"indexes/{index_key}", vectorstore)
+    return vectorstore
+
+
+def embed_docs(
+    digest, docs, embeddings, namespace, key="", quantization=None, lexical=False
+):
+    """Build, persist and cache the index; ``lexical`` also builds BM25 postings."""
+    vectorstore = find_vectorstore(digest, embeddings, namespace, key, quantization)
+    if vectorstore is not None:
+        return vectorstore
+    index_key = _index_key(digest, namespace, key, quantization)
+    cached_embeddings = cache_backed_embeddings(embeddings, namespace, quantization)
+    vectorstore, vectors = build_vectorstore(docs, cached_embeddings, quantization)
+    if not isinstance(vectorstore.index, faiss.IndexFlat):
+        recall = recall_at_k(vectorstore.index, vectors)
+        logger.info("Index recall@4 against exact search: %.3f", recall)
+    lexical = LexicalIndex.from_vectorstore(vectorstore) if lexical else None
+    index_folder = f"{CACHE_DIR}/indexes/{index_key}"
+    os.makedirs(os.path.dirname(index_folder), exist_ok=True)
+    save_vectorstore(vectorstore, index_folder, lexical=lexical)
+    cache.put(f"indexes/{index_key}", vectorstore)
+    if lexical is not None:
+        cache.put(f"lexical/{index_key}", lexical)
+    return vectorstore
+
+
+def lexical_index(vectorstore, digest, namespace, key="", quantization=None):
+    index_key = _index_key(digest, namespace, key, quantization)
+    lexical = cache.get(f"lexical/{index_key}")
+    if lexical is None:
+        lexical_path = f"{CACHE_DIR}/indexes/{index_key}/lexical.pkl"
+        if os.path.exists(lexical_path):
+            lexical = LexicalIndex.load(lexical_path)
+        else:
+            # 렉시컬 인덱스 없이 저장된 인덱스면 지금 만들어 옆에 저장해 둔다
+            lexical = LexicalIndex.from_vectorstore(vectorstore)
+            if os.path.isdir(os.path.dirname(lexical_path)):
+                tmp_path = f"{lexical_path}.{uuid.uuid4().hex}.tmp"
+                lexical.save(tmp_path)
+                os.replace(tmp_path, lexical_path)
+        cache.put(f"lexical/{index_key}", lexical)
+    return lexical
+
+
+def ingest_file(
+    digest,
+    file_path,
+    embeddings,
+    namespace,
+    loader_cls=UnstructuredFileLoader,
+    chunk_size=600,
+    chunk_overlap=100,
+    separator="\n",
+    quantization=None,
+    lexical=False,
+):
+    docs = split_file(
+        file_path,
+        digest,
+        loader_cls=loader_cls,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separator=separator,
+    )
+    key = splitter_key(chunk_size, chunk_overlap, separator)
+    return embed_docs(
+        digest,
+        docs,
+        embeddings,
+        namespace,
+        key=key,
+        quantization=quantization,
+        lexical=lexical,
+    )
+
+
+def ingest(content, name, embeddings, namespace, **options):
+    digest, file_path = save_content(content, name)
+    return ingest_file(digest, file_path, embeddings, namespace, **options)
+
+
+def hybrid_file(digest, file_path, embeddings, namespace, vector_timeout=None):
+    """Search function over a saved file that fuses dense and BM25 rankings."""
+    vectorstore = ingest_file(digest, file_path, embeddings, namespace, lexical=True)
+    lexical = lexical_index(vectorstore, digest, namespace, key=splitter_key())
+    return HybridSearch(
+        vectorstore,
+        lexical,
+        query_embeddings=get_query_embeddings(namespace, embeddings),
+        vector_timeout=vector_timeout,
+    )
+
+
+class IngestionJob:
+    """Embeds one upload on a background thread, indexing chunks as they arrive.
+
+    The partial flat index is searchable while the job runs. Once every chunk
+    is in, the final index is built from the embedding cache and persisted
+    like any other ingestion, with ``quantization`` applied to both.
+    """
+
+    def __init__(
+        self,
+        digest,
+        file_path,
+        name,
+        embeddings,
+        namespace,
+        batch_size=INGEST_BATCH,
+        quantization=None,
+    ):
+        self.digest = digest
+        self.file_path = file_path
+        self.name = name
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.quantization = quantization
+        self.vectorstore = None
+        self.parsed = 0
+        self.indexed = 0
+        self.parts = 1
+        self.completed = 0.0
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _run(self):
+        try:
+            key = splitter_key()
+            vectorstore = find_vectorstore(
+                self.digest, self.embeddings, self.namespace, key, self.quantization
+            )
+            if vectorstore is None:
+                vectorstore = self._ingest(key)
+            if vectorstore is not None:
+                with self.lock:
+                    self.vectorstore = vectorstore
+                self.parsed = self.indexed = vectorstore.index.ntotal
+        except Exception as e:
+            logger.exception("Ingesting %s failed", self.name)
+            self.error = e
+        finally:
+            self.done = True
+
+    def _parts(self, key):
+        docs = _cached_chunks(f"{self.digest}-{key}")
+        if docs is not None:
+            yield docs
+            return
+        parts = file_parts(self.file_path)
+        self.parts = len(parts)
+        docs = []
+        for part in stream_file(
+            self.file_path,
+            parts=parts,
+            separator="\n",
+            chunk_size=600,
+            chunk_overlap=100,
+        ):
+            for doc in part:
+                doc.metadata["content_hash"] = self.digest
+            docs.extend(part)
+            yield part
+        _save_chunks(f"{self.digest}-{key}", docs)
+
+    def _index(self, pending, cached_embeddings, block):
+        """Add every finished batch to the partial index."""
+        done, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            batch, weight = pending.pop(future)
+            texts = [doc.page_content for doc in batch]
+            text_embeddings = list(zip(texts, future.result()))
+            metadatas = [doc.metadata for doc in batch]
+            with self.lock:
+                if self.vectorstore is None:
+                    self.vectorstore = FAISS.from_embeddings(
+                        text_embeddings, cached_embeddings, metadatas
+                    )
+                else:
+                    self.vectorstore.add_embeddings(text_embeddings, metadatas)
+            self.indexed += len(batch)
+            self.completed += weight
+
+    def _ingest(self, key):
+        cached_embeddings = cache_backed_embeddings(
+            self.embeddings, self.namespace, self.quantization
+        )
+        docs = []
+        pending = {}
+        # 큰 묶음을 BatchedEmbeddings에 넘겨 병렬 요청을 쓰고, 끝나는 대로 검색에 넣는다
+        with ThreadPoolExecutor(max_workers=INGEST_WORKERS) as executor:
+            try:
+                for part in self._parts(key):
+                    self.parsed += len(part)
+                    for start in range(0, len(part), self.batch_size):
+                        batch = part[start : start + self.batch_size]
+                        future = executor.submit(
+                            cached_embeddings.embed_documents,
+                            [doc.page_content for doc in batch],
+                        )
+                        pending[future] = (batch, len(batch) / len(part) / self.parts)
+                    docs.extend(part)
+                    self._index(pending, cached_embeddings, block=False)
+                    if self.cancelled:
+                        return None
+                while pending:
+                    self._index(pending, cached_embeddings, block=True)
+                    if self.cancelled:
+                        return None
+            finally:
+                for future in pending:
+                    future.cancel()
+        # 모든 벡터가 캐시에 있으니 최종 인덱스는 API 호출 없이 만들어진다
+        return embed_docs(
+            self.digest,
+            docs,
+            self.embeddings,
+            self.namespace,
+            key=key,
+            quantization=self.quantization,
+        )
+
+    def ready(self):
+        return self.vectorstore is not None and (
+            self.done or self.indexed >= READY_AFTER
+        )
+
+    def progress(self):
+        # 파싱된 청크 수는 파트마다 늘어나니 파트 수를 기준으로 센다
+        if self.done:
+            return 1.0
+        return min(self.completed, 1.0)
+
+    def search(self, query, k=4):
+        with self.lock:
+            if self.vectorstore is None:
+                return []
+            k = min(k, self.vectorstore.index.ntotal)
+            return self.vectorstore.similarity_search_with_score(query, k=k)
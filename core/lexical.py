@@ -0,0 +1,132 @@
+import heapq
+import logging
+import math
+import pickle
+import re
+from array import array
+from collections import Counter
+
+from core.embeddings import embed_query_within
+
+logger = logging.getLogger(__name__)
+
+# 부품 번호처럼 하이픈이나 점으로 이어진 영숫자는 한 토큰으로도 남긴다
+_WORD = re.compile(r"[0-9a-z]+(?:[-_./][0-9a-z]+)*")
+_HANGUL = re.compile(r"[가-힣]+")
+
+def tokenize(text):
+    text = text.lower()
+    tokens = []
+    for word in _WORD.findall(text):
+        tokens.append(word)
+        parts = re.split(r"[-_./]", word)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    # 한국어는 조사가 붙어도 맞도록 어절과 글자 바이그램을 함께 색인한다
+    for run in _HANGUL.findall(text):
+        tokens.append(run)
+        tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class LexicalIndex:
+    """BM25 over an inverted index of compact posting arrays."""
+
+    def __init__(self, ids, postings, lengths):
+        self.ids = ids
+        self.postings = postings
+        self.lengths = lengths
+        self.average_length = sum(lengths) / max(len(lengths), 1)
+
+    @classmethod
+    def build(cls, ids, texts):
+        postings = {}
+        lengths = array("I")
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                positions, frequencies = postings.setdefault(
+                    term, (array("I"), array("H"))
+                )
+                positions.append(position)
+                frequencies.append(min(frequency, 65535))
+        return cls(ids, postings, lengths)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        ids = [
+            vectorstore.index_to_docstore_id[i]
+            for i in range(len(vectorstore.index_to_docstore_id))
+        ]
+        texts = [vectorstore.docstore.search(id).page_content for id in ids]
+        return cls.build(ids, texts)
+
+    def search(self, query, k=4, k1=1.2, b=0.75):
+        count = len(self.ids)
+        scores = {}
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            positions, frequencies = self.postings[term]
+            idf = math.log(1 + (count - len(positions) + 0.5) / (len(positions) + 0.5))
+            for position, frequency in zip(positions, frequencies):
+                length = self.lengths[position] / self.average_length
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (
+                    k1 + 1
+                ) / (frequency + k1 * (1 - b + b * length))
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.ids[position], score) for position, score in top]
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump((self.ids, self.postings, self.lengths), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls(*pickle.load(f))
+
+
+class HybridSearch:
+    """Fuses FAISS and BM25 rankings with reciprocal rank fusion.
+
+    If the query embedding does not come back within ``vector_timeout``
+    seconds the lexical ranking is used on its own. Pass the backend's
+    ``CachedQueryEmbeddings`` as ``query_embeddings`` so a question already
+    being embedded elsewhere is not embedded twice. Scores are returned
+    negated so that, like FAISS distances, lower means more relevant.
+    """
+
+    def __init__(
+        self, vectorstore, lexical, query_embeddings=None, vector_timeout=None, rrf_k=60
+    ):
+        self.vectorstore = vectorstore
+        self.lexical = lexical
+        self.query_embeddings = query_embeddings or vectorstore.embedding_function
+        self.vector_timeout = vector_timeout
+        self.rrf_k = rrf_k
+
+    def __call__(self, query, k=4):
+        fetch_k = min(k * 2, len(self.lexical.ids))
+        docs = {}
+        scores = {}
+        for rank, (id, _) in enumerate(self.lexical.search(query, fetch_k)):
+            doc = self.vectorstore.docstore.search(id)
+            docs[doc.page_content] = doc
+            scores[doc.page_content] = 1 / (self.rrf_k + rank + 1)
+        vector = embed_query_within(self.query_embeddings, query, self.vector_timeout)
+        if vector is None:
+            logger.info("Query embedding timed out, answering from the lexical index")
+            dense_results = []
+        else:
+            dense_results = self.vectorstore.similarity_search_with_score_by_vector(
+                vector, fetch_k
+            )
+        for rank, (doc, _) in enumerate(dense_results):
+            docs.setdefault(doc.page_content, doc)
+            scores[doc.page_content] = scores.get(doc.page_content, 0.0) + 1 / (
+                self.rrf_k + rank + 1
+            )
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(docs[text], -score) for text, score in ranked]
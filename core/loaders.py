@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain.document_loaders import UnstructuredFileLoader
+from pypdf import PdfReader, PdfWriter
+
+from core.splitter import get_splitter
+
+# 큰 PDF는 이 페이지 수 단위로 잘라서 여러 프로세스가 나눠 파싱한다
+PAGES_PER_PART = 20
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(max_workers=None):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Streamlit 서버는 스레드가 많아서 fork 대신 spawn으로 워커를 띄운다
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def split_pdf(file_path, pages_per_part=PAGES_PER_PART):
+    reader = PdfReader(file_path)
+    if len(reader.pages) <= pages_per_part:
+        return [file_path]
+    base, _ = os.path.splitext(file_path)
+    parts = []
+    for start in range(0, len(reader.pages), pages_per_part):
+        part_path = f"{base}.pages-{start}.pdf"
+        if not os.path.exists(part_path):
+            writer = PdfWriter()
+            for page in reader.pages[start : start + pages_per_part]:
+                writer.add_page(page)
+            with open(part_path, "wb") as f:
+                writer.write(f)
+        parts.append(part_path)
+    return parts
+
+
+def load_and_split(file_path, loader_cls, splitter_settings):
+    splitter = get_splitter(**splitter_settings)
+    return loader_cls(file_path).load_and_split(text_splitter=splitter)
+
+
+def file_parts(file_path, loader_cls=UnstructuredFileLoader):
+    """The files one upload is parsed as: page ranges for a large PDF."""
+    if loader_cls is UnstructuredFileLoader and file_path.lower().endswith(".pdf"):
+        return split_pdf(file_path)
+    return [file_path]
+
+
+def _submit(pool, file_path, loader_cls, splitter_settings, parts=None):
+    return [
+        pool.submit(load_and_split, part, loader_cls, splitter_settings)
+        for part in parts or file_parts(file_path, loader_cls)
+    ]
+
+
+def _with_source(docs, file_path):
+    for doc in docs:
+        doc.metadata["source"] = file_path
+    return docs
+
+
+def _collect(jobs):
+    for file_path, futures in jobs:
+        docs = []
+        for future in futures:
+            docs.extend(future.result())
+        yield file_path, _with_source(docs, file_path)
+
+
+def load_files(file_paths, loader_cls=UnstructuredFileLoader, **splitter_settings):
+    """Parse files on the process pool and yield their chunks in input order.
+
+    Every file (and every page range of a large PDF) is submitted up front,
+    so later files keep parsing while the caller embeds the earlier ones.
+    """
+    pool = get_pool()
+    jobs = [
+        (file_path, _submit(pool, file_path, loader_cls, splitter_settings))
+        for file_path in file_paths
+    ]
+    return _collect(jobs)
+
+
+def stream_file(
+    file_path, loader_cls=UnstructuredFileLoader, parts=None, **splitter_settings
+):
+    """Yield the chunks of each part of one file, in order, as parts finish.
+
+    ``parts`` lets a caller that already called ``file_parts`` (to know how
+    many parts to expect) avoid splitting the file twice.
+    """
+    for future in _submit(get_pool(), file_path, loader_cls, splitter_settings, parts):
+        yield _with_source(future.result(), file_path)
@@ -0,0 +1,51 @@
+import hashlib
+import struct
+import uuid
+
+import numpy as np
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage.encoder_backed import EncoderBackedStore
+
+QUANTIZATIONS = ("fp16", "int8")
+
+_NAMESPACE_UUID = uuid.UUID(int=1985)
+
+
+def encode_vector(vector, quantization):
+    vector = np.asarray(vector, dtype=np.float32)
+    if quantization == "fp16":
+        return vector.astype(np.float16).tobytes()
+    if quantization == "int8":
+        # 벡터마다 최대 절댓값으로 스케일을 잡아 [-127, 127]에 담는다
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        codes = np.round(vector / scale).astype(np.int8)
+        return struct.pack("<f", scale) + codes.tobytes()
+    raise ValueError(f"Unknown quantization: {quantization}")
+
+
+def decode_vector(data, quantization):
+    if quantization == "fp16":
+        vector = np.frombuffer(data, dtype=np.float16).astype(np.float32)
+    elif quantization == "int8":
+        (scale,) = struct.unpack("<f", data[:4])
+        vector = np.frombuffer(data[4:], dtype=np.int8).astype(np.float32) * scale
+    else:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    return vector.tolist()
+
+
+def quantized_cache_embeddings(embeddings, store, quantization, namespace=""):
+    """CacheBackedEmbeddings that keeps binary vectors instead of JSON."""
+    prefix = f"{namespace}{quantization}:"
+
+    def key_encoder(text):
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return prefix + str(uuid.uuid5(_NAMESPACE_UUID, digest))
+
+    encoder_backed_store = EncoderBackedStore(
+        store,
+        key_encoder,
+        lambda vector: encode_vector(vector, quantization),
+        lambda data: decode_vector(data, quantization),
+    )
+    return CacheBackedEmbeddings(embeddings, encoder_backed_store)
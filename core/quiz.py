@@ -0,0 +1,190 @@
+import json
+import random
+import re
+
+from langchain.schema.output_parser import StrOutputParser
+from langchain.schema.runnable import RunnableLambda
+
+from core.tokens import count_tokens
+
+_QUESTION = re.compile(r"^\s*Question:", re.MULTILINE)
+_CORRECT = re.compile(r"\s*\(o\)\s*$")
+
+QUIZ_FUNCTION = {
+    "name": "create_quiz",
+    "description": "Create a multiple choice quiz with one correct answer per question.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "questions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "question": {"type": "string"},
+                        "answers": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "answer": {"type": "string"},
+                                    "correct": {"type": "boolean"},
+                                },
+                                "required": ["answer", "correct"],
+                            },
+                        },
+                    },
+                    "required": ["question", "answers"],
+                },
+            }
+        },
+        "required": ["questions"],
+    },
+}
+
+
+def docs_tokens(docs):
+    return sum(count_tokens(doc.page_content) for doc in docs)
+
+
+def group_docs(docs, max_tokens=3000):
+    """Consecutive chunks packed into groups of at most ``max_tokens``."""
+    groups = []
+    group, group_tokens = [], 0
+    for doc in docs:
+        tokens = count_tokens(doc.page_content)
+        if group and group_tokens + tokens > max_tokens:
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(doc)
+        group_tokens += tokens
+    if group:
+        groups.append(group)
+    return groups
+
+
+def split_questions(text):
+    """Cut ``Question: ... Answers: ...`` output into one block per question."""
+    starts = [match.start() for match in _QUESTION.finditer(text)]
+    return [
+        text[start:end].strip()
+        for start, end in zip(starts, starts[1:] + [len(text)])
+        if "Answers:" in text[start:end]
+    ]
+
+
+def parse_quiz_text(text):
+    """Parse the ``Answers: a|b(o)|c|d`` text format into the quiz schema."""
+    questions = []
+    for block in split_questions(text):
+        question, answers = block.split("Answers:", 1)
+        questions.append(
+            {
+                "question": question.replace("Question:", "", 1).strip(),
+                "answers": [
+                    {
+                        "answer": _CORRECT.sub("", answer).strip(),
+                        "correct": bool(_CORRECT.search(answer)),
+                    }
+                    for answer in answers.strip().split("\n", 1)[0].split("|")
+                ],
+            }
+        )
+    return {"questions": questions}
+
+
+def validate_quiz(data):
+    """Keep only well-formed questions with exactly one correct answer."""
+    questions = []
+    for question in data.get("questions", []):
+        if not isinstance(question, dict) or not question.get("question"):
+            continue
+        answers = []
+        for answer in question.get("answers", []):
+            if not isinstance(answer, dict) or "answer" not in answer:
+                continue
+            text = str(answer["answer"])
+            # 모델이 예시를 따라 (o)를 답에 남기는 경우가 있다
+            correct = bool(answer.get("correct")) or bool(_CORRECT.search(text))
+            answers.append(
+                {"answer": _CORRECT.sub("", text).strip(), "correct": correct}
+            )
+        if len(answers) >= 2 and sum(answer["correct"] for answer in answers) == 1:
+            questions.append(
+                {"question": str(question["question"]).strip(), "answers": answers}
+            )
+    return {"questions": questions}
+
+
+def parse_quiz_call(message):
+    """Read the ``create_quiz`` call of a forced function call.
+
+    Arguments that are not valid JSON are read with the text parser, since
+    the model sometimes writes the prompt's example format there instead.
+    Raises ``ValueError`` when no usable question comes out either way.
+    """
+    arguments = (message.additional_kwargs.get("function_call") or {}).get(
+        "arguments"
+    )
+    if not arguments:
+        raise ValueError("The model did not call create_quiz.")
+    try:
+        quiz = validate_quiz(json.loads(arguments))
+    except (json.JSONDecodeError, AttributeError, TypeError):
+        quiz = validate_quiz(parse_quiz_text(arguments))
+    if not quiz["questions"]:
+        raise ValueError("The create_quiz call had no usable quiz questions.")
+    return quiz
+
+
+def parse_quiz_reply(text):
+    """Read a plain ``Question: ... Answers: ...`` reply."""
+    quiz = validate_quiz(parse_quiz_text(text))
+    if not quiz["questions"]:
+        raise ValueError("The model did not return any usable quiz questions.")
+    return quiz
+
+
+def quiz_chain(prompt, llm):
+    """Prompt and model that make a quiz through a forced ``create_quiz`` call.
+
+    With a forced function call the reply has no text content, so when the
+    call is missing or unusable the same prompt is sent once more without
+    functions and the text reply is parsed instead.
+    """
+    forced = (
+        prompt
+        | llm.bind(functions=[QUIZ_FUNCTION], function_call={"name": "create_quiz"})
+        | RunnableLambda(parse_quiz_call)
+    )
+    text = prompt | llm | StrOutputParser() | RunnableLambda(parse_quiz_reply)
+    return forced.with_fallbacks([text], exceptions_to_handle=(ValueError,))
+
+
+def _normalize(question):
+    return re.sub(r"\W+", " ", question).strip().lower()
+
+
+def pick_questions(quizzes, count=10):
+    """Deduplicate candidate questions and sample ``count`` across all groups.
+
+    Questions are taken round-robin from each group's shuffled candidates so
+    the quiz covers the whole input rather than only its beginning.
+    """
+    seen = set()
+    candidates = []
+    for quiz in quizzes:
+        questions = []
+        for question in quiz["questions"]:
+            key = _normalize(question["question"])
+            if key not in seen:
+                seen.add(key)
+                questions.append(question)
+        random.shuffle(questions)
+        candidates.append(questions)
+    picked = []
+    while len(picked) < count and any(candidates):
+        for questions in candidates:
+            if questions and len(picked) < count:
+                picked.append(questions.pop())
+    return {"questions": picked}
@@ -0,0 +1,147 @@
+import json
+import logging
+import re
+
+from langchain.prompts import ChatPromptTemplate
+from langchain.schema.runnable import RunnableLambda
+
+from core import runtime
+
+logger = logging.getLogger(__name__)
+
+MAX_SCORE = 5
+# 이만큼 만점 답이 모이면 남은 청크는 기다리지 않는다
+TOP_ANSWERS = 3
+RERANK_TIMEOUT = 30
+
+ANSWER_FUNCTION = {
+    "name": "score_answer",
+    "description": "Answer the question from the context and rate how well it does.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "answer": {"type": "string"},
+            "score": {"type": "integer", "minimum": 0, "maximum": MAX_SCORE},
+        },
+        "required": ["answer", "score"],
+    },
+}
+
+answers_prompt = ChatPromptTemplate.from_template(
+    """
+    Using ONLY the following context answer the user's question. If you can't just say you don't know, don't make anything up.
+
+    Then, give a score to the answer between 0 and 5.
+
+    If the answer answers the user question the score should be high, else it should be low.
+
+    Make sure to always include the answer's score even if it's 0.
+
+    Context: {context}
+
+    Question: {question}
+"""
+)
+
+choose_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """
+            Use ONLY the following pre-existing answers to answer the user's question.
+
+            Use the answers that have the highest score (more helpful) and favor the most recent ones.
+
+            Cite sources and return the sources of the answers as they are, do not change them.
+
+            Answers: {answers}
+            """,
+        ),
+        ("human", "{question}"),
+    ]
+)
+
+_SCORE = re.compile(r"Score:\s*(\d+)", re.IGNORECASE)
+
+
+def parse_scored_answer(message):
+    """Read the ``score_answer`` call, falling back to a ``Score: n`` line."""
+    function_call = message.additional_kwargs.get("function_call")
+    if function_call:
+        try:
+            data = json.loads(function_call["arguments"])
+            return {
+                "answer": str(data["answer"]).strip(),
+                "score": min(max(int(data["score"]), 0), MAX_SCORE),
+            }
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            pass
+    text = message.content or ""
+    match = _SCORE.search(text)
+    return {
+        "answer": _SCORE.sub("", text).strip(),
+        "score": min(int(match.group(1)), MAX_SCORE) if match else 0,
+    }
+
+
+def answer_chain(llm):
+    """Prompt, model and parser that answer from one chunk and score it."""
+    return (
+        answers_prompt
+        | llm.bind(functions=[ANSWER_FUNCTION], function_call={"name": "score_answer"})
+        | RunnableLambda(parse_scored_answer)
+    )
+
+
+def map_rerank(
+    docs,
+    question,
+    chain,
+    backend="openai",
+    top_n=TOP_ANSWERS,
+    timeout=RERANK_TIMEOUT,
+):
+    """Score every chunk's answer concurrently and keep the ``top_n`` best.
+
+    Calls run under the backend's concurrency limit. As soon as ``top_n``
+    answers reach ``MAX_SCORE``, or ``timeout`` passes, the calls still in
+    flight are cancelled, so latency stays close to one call rather than
+    growing with the number of chunks.
+    """
+    inputs = [{"context": doc.page_content, "question": question} for doc in docs]
+    sources = {id(input): doc for input, doc in zip(inputs, docs)}
+
+    def enough(outputs):
+        best = [
+            output
+            for output in outputs
+            if not isinstance(output, Exception) and output["score"] >= MAX_SCORE
+        ]
+        return len(best) >= top_n
+
+    answers = []
+    for input, output in runtime.batch_until(
+        chain, inputs, backend, enough=enough, timeout=timeout
+    ):
+        if isinstance(output, Exception):
+            logger.warning("Scoring a chunk failed: %s", output)
+            continue
+        if not output["score"]:
+            continue
+        doc = sources[id(input)]
+        answers.append(
+            {
+                **output,
+                "source": doc.metadata.get("source", ""),
+                "date": doc.metadata.get("lastmod", ""),
+            }
+        )
+    answers.sort(key=lambda answer: answer["score"], reverse=True)
+    return answers[:top_n]
+
+
+def format_answers(answers):
+    return "\n\n".join(
+        f"{answer['answer']}\nSource:{answer['source']}\nDate:{answer['date']}\n"
+        for answer in answers
+    )
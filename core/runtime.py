@@ -0,0 +1,179 @@
+import asyncio
+import queue
+import threading
+
+# 백엔드별로 동시에 진행할 수 있는 LLM 호출 수
+BACKEND_LIMITS = {
+    "openai": 32,
+    "ollama": 2,
+}
+DEFAULT_LIMIT = 8
+
+_loop = None
+_loop_lock = threading.Lock()
+_semaphores = {}
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def get_loop():
+    """The one event loop every Streamlit session hands its chain calls to."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+        return _loop
+
+
+def _semaphore(backend):
+    # 세마포어는 항상 루프 스레드에서만 만들고 쓴다
+    if backend not in _semaphores:
+        _semaphores[backend] = asyncio.Semaphore(
+            BACKEND_LIMITS.get(backend, DEFAULT_LIMIT)
+        )
+    return _semaphores[backend]
+
+
+async def _limited(backend, coro):
+    async with _semaphore(backend):
+        return await coro
+
+
+def run(coro, backend="default"):
+    """Run ``coro`` on the shared loop under the backend limit and wait for it."""
+    future = asyncio.run_coroutine_threadsafe(_limited(backend, coro), get_loop())
+    try:
+        return future.result()
+    finally:
+        future.cancel()
+
+
+def invoke(runnable, input, backend="default"):
+    return run(runnable.ainvoke(input), backend)
+
+
+def batch(runnable, inputs, backend="default", return_exceptions=False):
+    """Invoke ``runnable`` on every input concurrently, each under the limit.
+
+    With ``return_exceptions`` a failed call's output is its exception and
+    the other calls still run to completion.
+    """
+
+    async def gather():
+        return await asyncio.gather(
+            *(_limited(backend, runnable.ainvoke(input)) for input in inputs),
+            return_exceptions=return_exceptions,
+        )
+
+    future = asyncio.run_coroutine_threadsafe(gather(), get_loop())
+    try:
+        return future.result()
+    finally:
+        future.cancel()
+
+
+def batch_until(runnable, inputs, backend="default", enough=None, timeout=None):
+    """Invoke ``runnable`` on every input concurrently, stopping early.
+
+    Returns ``(input, output)`` pairs in completion order; a failed call's
+    output is its exception. Once ``enough(outputs)`` is true or ``timeout``
+    seconds have passed, the calls still running are cancelled.
+    """
+
+    async def call(input):
+        try:
+            return input, await _limited(backend, runnable.ainvoke(input))
+        except Exception as e:
+            return input, e
+
+    async def gather():
+        tasks = [asyncio.ensure_future(call(input)) for input in inputs]
+        results = []
+        try:
+            for task in asyncio.as_completed(tasks, timeout=timeout):
+                results.append(await task)
+                if enough and enough([output for _, output in results]):
+                    break
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+        return results
+
+    future = asyncio.run_coroutine_threadsafe(gather(), get_loop())
+    try:
+        return future.result()
+    finally:
+        future.cancel()
+
+
+def iterate(aiterable):
+    """Yield the items of an async iterable running on the shared loop."""
+    items = queue.Queue()
+
+    async def produce():
+        try:
+            async for item in aiterable:
+                items.put(item)
+        except Exception as e:
+            items.put(_Failure(e))
+        finally:
+            items.put(_DONE)
+
+    future = asyncio.run_coroutine_threadsafe(produce(), get_loop())
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        future.cancel()
+
+
+def stream(runnable, input, backend="default", native_async=True):
+    """Yield the chunks of ``runnable.astream(input)`` in the calling thread.
+
+    The call itself runs on the shared loop. Models without a native async
+    stream (``native_async=False``) are streamed on the loop's executor so
+    they still stream token by token under the same backend limit.
+    """
+    chunks = queue.Queue()
+
+    def stream_sync():
+        for chunk in runnable.stream(input):
+            chunks.put(chunk)
+
+    async def produce():
+        try:
+            async with _semaphore(backend):
+                if native_async:
+                    async for chunk in runnable.astream(input):
+                        chunks.put(chunk)
+                else:
+                    await asyncio.get_running_loop().run_in_executor(None, stream_sync)
+        except Exception as e:
+            chunks.put(_Failure(e))
+        finally:
+            chunks.put(_DONE)
+
+    future = asyncio.run_coroutine_threadsafe(produce(), get_loop())
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is _DONE:
+                return
+            if isinstance(chunk, _Failure):
+                raise chunk.error
+            yield chunk
+    finally:
+        # Streamlit이 스크립트를 중단하면 남은 호출도 취소한다
+        future.cancel()
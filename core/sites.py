@@ -0,0 +1,128 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from langchain.vectorstores.faiss import FAISS
+
+from core import runtime
+from core.crawler import CrawlState
+from core.ingest import CACHE_DIR, cache_backed_embeddings, content_hash
+from core.vectorstore import load_vectorstore
+
+logger = logging.getLogger(__name__)
+
+# 이보다 오래된 크롤 결과는 페이지를 열 때 조건부 요청으로 다시 확인한다
+REFRESH_AFTER = 60 * 60
+
+
+class SiteIndex:
+    """Persistent index over one sitemap, updated page by page on re-crawl.
+
+    Chunk ids are recorded per page in the crawl state, so a changed page has
+    its old chunks replaced and a page that left the sitemap is deleted from
+    the index. Unchanged pages are never re-split or re-embedded.
+    """
+
+    def __init__(self, sitemap_url, embeddings, namespace):
+        self.sitemap_url = sitemap_url
+        self.folder = f"{CACHE_DIR}/sites/{content_hash(sitemap_url.encode())}"
+        self.embeddings = cache_backed_embeddings(embeddings, namespace)
+        self.state = CrawlState(f"{self.folder}/state.json")
+        # 페이지 단위로 지우고 더해야 하니 mmap 없이 쓰기 가능한 인덱스로 연다
+        self.vectorstore = load_vectorstore(
+            f"{self.folder}/index", self.embeddings, mmap=False
+        )
+        # 크롤은 한 번에 하나씩, 인덱스는 바꾸는 짧은 순간에만 잠가 검색을 막지 않는다
+        self.update_lock = threading.Lock()
+        self.lock = threading.Lock()
+
+    def stale(self):
+        crawled_at = self.state.crawled_at
+        return crawled_at is None or time.time() - crawled_at > REFRESH_AFTER
+
+    def _remove(self, url):
+        page = self.state.remove(url)
+        if page and page.get("ids") and self.vectorstore is not None:
+            try:
+                self.vectorstore.delete(page["ids"])
+            except ValueError:
+                # 인덱스 저장 뒤 상태를 저장하기 전에 멈췄던 경우
+                logger.warning("Chunks of %s were already gone from the index", url)
+
+    def _replace(self, page, chunks):
+        url = page.metadata["source"]
+        texts = [chunk.page_content for chunk in chunks]
+        text_embeddings = list(zip(texts, self.embeddings.embed_documents(texts)))
+        metadatas = [chunk.metadata for chunk in chunks]
+        ids = [uuid.uuid4().hex for _ in chunks]
+        with self.lock:
+            self._remove(url)
+            if chunks:
+                if self.vectorstore is None:
+                    self.vectorstore = FAISS.from_embeddings(
+                        text_embeddings, self.embeddings, metadatas, ids=ids
+                    )
+                else:
+                    self.vectorstore.add_embeddings(text_embeddings, metadatas, ids=ids)
+            self.state.update(
+                url,
+                ids=ids,
+                content_hash=page.metadata["content_hash"],
+                lastmod=page.metadata.get("lastmod"),
+                etag=page.metadata.get("etag"),
+                last_modified=page.metadata.get("last_modified"),
+            )
+
+    def update(self, crawler, splitter):
+        """Re-crawl the sitemap and apply only what changed since last time."""
+        with self.update_lock:
+            changed = removed = 0
+            for page in runtime.iterate(
+                crawler.crawl(self.sitemap_url, state=self.state)
+            ):
+                self._replace(page, splitter.split_documents([page]))
+                changed += 1
+            with self.lock:
+                # 사이트맵을 못 읽어 목록이 비었을 때 인덱스를 통째로 지우지 않는다
+                if crawler.urls:
+                    for url in self.state.urls() - crawler.urls:
+                        self._remove(url)
+                        removed += 1
+                if changed or removed or not os.path.exists(f"{self.folder}/index"):
+                    self._save()
+                self.state.save()
+            logger.info(
+                "Crawled %s: %d changed, %d removed", self.sitemap_url, changed, removed
+            )
+            return {
+                "pages": len(self.state.pages),
+                "changed": changed,
+                "removed": removed,
+            }
+
+    def search(self, query, k=4):
+        """``(doc, score)`` pairs for ``query``, safe to call during a re-crawl."""
+        embedding = self.embeddings.embed_query(query)
+        with self.lock:
+            if self.vectorstore is None or not self.vectorstore.index.ntotal:
+                return []
+            return self.vectorstore.similarity_search_with_score_by_vector(
+                embedding, k=min(k, self.vectorstore.index.ntotal)
+            )
+
+    def _save(self):
+        if self.vectorstore is None:
+            return
+        index_folder = f"{self.folder}/index"
+        tmp_folder = f"{index_folder}.{uuid.uuid4().hex}.tmp"
+        self.vectorstore.save_local(tmp_folder)
+        if os.path.exists(index_folder):
+            old_folder = f"{index_folder}.{uuid.uuid4().hex}.old"
+            os.rename(index_folder, old_folder)
+            os.rename(tmp_folder, index_folder)
+            shutil.rmtree(old_folder, ignore_errors=True)
+        else:
+            os.rename(tmp_folder, index_folder)
@@ -0,0 +1,79 @@
+from collections import deque
+from functools import lru_cache
+from typing import Iterable, List
+
+from langchain.text_splitter import CharacterTextSplitter, RecursiveCharacterTextSplitter
+
+from core.tokens import count_tokens
+
+# from_tiktoken_encoder의 기본값과 같아야 청크 경계와 캐시된 청크가 그대로 유지된다
+SPLITTER_ENCODING = "gpt2"
+
+
+@lru_cache(maxsize=8192)
+def token_length(text, encoding_name=SPLITTER_ENCODING):
+    return count_tokens(text, encoding_name)
+
+
+class _TokenMergeMixin:
+    """Merges pieces by token lengths that are each computed only once.
+
+    LangChain's merge re-encodes the first piece every time it drops one from
+    the window and copies the window list on every drop.
+    """
+
+    def _merge_splits(self, splits: Iterable[str], separator: str) -> List[str]:
+        separator_len = self._length_function(separator)
+        docs = []
+        window = deque()
+        total = 0
+        for split in splits:
+            length = self._length_function(split)
+            if window and total + length + separator_len > self._chunk_size:
+                doc = self._join_docs([piece for piece, _ in window], separator)
+                if doc is not None:
+                    docs.append(doc)
+                while total > self._chunk_overlap or (
+                    total + length + (separator_len if window else 0)
+                    > self._chunk_size
+                    and total > 0
+                ):
+                    _, dropped = window.popleft()
+                    total -= dropped + (separator_len if window else 0)
+            window.append((split, length))
+            total += length + (separator_len if len(window) > 1 else 0)
+        doc = self._join_docs([piece for piece, _ in window], separator)
+        if doc is not None:
+            docs.append(doc)
+        return docs
+
+
+class TokenCharacterTextSplitter(_TokenMergeMixin, CharacterTextSplitter):
+    def __init__(self, encoding_name=SPLITTER_ENCODING, **kwargs):
+        super().__init__(
+            length_function=lambda text: token_length(text, encoding_name), **kwargs
+        )
+
+
+class TokenRecursiveTextSplitter(_TokenMergeMixin, RecursiveCharacterTextSplitter):
+    def __init__(self, encoding_name=SPLITTER_ENCODING, **kwargs):
+        super().__init__(
+            length_function=lambda text: token_length(text, encoding_name), **kwargs
+        )
+
+
+@lru_cache(maxsize=None)
+def get_splitter(separator="\n", chunk_size=600, chunk_overlap=100):
+    return TokenCharacterTextSplitter(
+        separator=separator,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_recursive_splitter(chunk_size=1000, chunk_overlap=200):
+    return TokenRecursiveTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
@@ -0,0 +1,176 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from langchain.schema import BaseStore
+
+# SQLite가 한 문장에 받는 파라미터 개수 제한보다 작게 잡는다
+_MAX_VARIABLES = 500
+
+
+class SQLiteByteStore(BaseStore[str, bytes]):
+    """Single-file byte store for the embedding cache.
+
+    Every ``mget``/``mset`` is one transaction, and when the stored values
+    grow past ``max_bytes`` the least recently read entries are evicted.
+    """
+
+    def __init__(self, path, max_bytes=None):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # 새 파일이면 지운 공간을 incremental_vacuum으로 돌려줄 수 있게 한다
+        self.connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # 총 크기는 트리거가 meta 행에 유지하고, LRU 순회는 blob을 읽지 않는 커버링 인덱스로 한다
+        try:
+            self.connection.executescript(
+                """
+                BEGIN IMMEDIATE;
+                CREATE TABLE IF NOT EXISTS store (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+                DROP INDEX IF EXISTS store_accessed_at;
+                CREATE INDEX IF NOT EXISTS store_lru
+                    ON store (accessed_at, size, key);
+                CREATE TABLE IF NOT EXISTS meta (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO meta (name, value)
+                    SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM store;
+                CREATE TRIGGER IF NOT EXISTS store_insert AFTER INSERT ON store
+                BEGIN
+                    UPDATE meta SET value = value + NEW.size WHERE name = 'total_bytes';
+                END;
+                CREATE TRIGGER IF NOT EXISTS store_update AFTER UPDATE OF size ON store
+                BEGIN
+                    UPDATE meta SET value = value + NEW.size - OLD.size
+                        WHERE name = 'total_bytes';
+                END;
+                CREATE TRIGGER IF NOT EXISTS store_delete AFTER DELETE ON store
+                BEGIN
+                    UPDATE meta SET value = value - OLD.size WHERE name = 'total_bytes';
+                END;
+                COMMIT;
+                """
+            )
+        except Exception:
+            self.connection.rollback()
+            raise
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        values = {}
+        now = time.time()
+        with self.lock, self.connection:
+            for start in range(0, len(keys), _MAX_VARIABLES):
+                batch = list(keys[start : start + _MAX_VARIABLES])
+                placeholders = ",".join("?" * len(batch))
+                rows = self.connection.execute(
+                    f"SELECT key, value FROM store WHERE key IN ({placeholders})",
+                    batch,
+                )
+                values.update(rows)
+            if values:
+                self.connection.executemany(
+                    "UPDATE store SET accessed_at = ? WHERE key = ?",
+                    [(now, key) for key in values],
+                )
+        return [values.get(key) for key in keys]
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, bytes]]) -> None:
+        now = time.time()
+        freed = 0
+        with self.lock, self.connection:
+            # REPLACE는 삭제 트리거를 건너뛰니 UPSERT로 크기 변화를 반영한다
+            self.connection.executemany(
+                """
+                INSERT INTO store (key, value, size, accessed_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    value = excluded.value,
+                    size = excluded.size,
+                    accessed_at = excluded.accessed_at
+                """,
+                [(key, value, len(value), now) for key, value in key_value_pairs],
+            )
+            if self.max_bytes is not None:
+                freed = self._evict()
+        if freed:
+            self.compact()
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM store WHERE key = ?", [(key,) for key in keys]
+            )
+
+    def yield_keys(self, prefix: Optional[str] = None) -> Iterator[str]:
+        with self.lock:
+            if prefix is None:
+                rows = self.connection.execute("SELECT key FROM store").fetchall()
+            else:
+                rows = self.connection.execute(
+                    "SELECT key FROM store WHERE substr(key, 1, ?) = ?",
+                    (len(prefix), prefix),
+                ).fetchall()
+        for (key,) in rows:
+            yield key
+
+    def _total_bytes(self):
+        (size,) = self.connection.execute(
+            "SELECT value FROM meta WHERE name = 'total_bytes'"
+        ).fetchone()
+        return size
+
+    def size(self):
+        with self.lock:
+            return self._total_bytes()
+
+    def _evict(self):
+        size = self._total_bytes()
+        if size <= self.max_bytes:
+            return 0
+        # 한 번에 여유를 10% 남겨서 mset마다 eviction이 돌지 않게 한다
+        excess = size - int(self.max_bytes * 0.9)
+        freed = 0
+        keys = []
+        for key, value_size in self.connection.execute(
+            "SELECT key, size FROM store ORDER BY accessed_at"
+        ):
+            if freed >= excess:
+                break
+            keys.append((key,))
+            freed += value_size
+        self.connection.executemany("DELETE FROM store WHERE key = ?", keys)
+        return freed
+
+    def compact(self):
+        """Give the pages freed by deletes back to the file system."""
+        with self.lock:
+            (mode,) = self.connection.execute("PRAGMA auto_vacuum").fetchone()
+            if mode == 2:
+                self.connection.execute("PRAGMA incremental_vacuum").fetchall()
+            else:
+                # auto_vacuum 이전에 만들어진 파일은 한 번 전체 VACUUM으로 전환한다
+                self.connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                self.connection.execute("VACUUM")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_byte_store(path, max_bytes=None):
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = SQLiteByteStore(path, max_bytes=max_bytes)
+        return _stores[path]
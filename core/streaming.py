@@ -0,0 +1,103 @@
+import logging
+import time
+from typing import Any
+
+import streamlit as st
+from langchain.callbacks.base import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingRenderer:
+    """Draws a streamed answer without re-sending the whole text per token.
+
+    Tokens are buffered and drawn at most every ``interval`` seconds (or once
+    ``max_buffer`` characters are pending). Finished paragraphs are frozen in
+    their own element, so each redraw only re-sends the paragraph that is
+    still growing instead of the whole answer.
+    """
+
+    def __init__(self, container, interval=0.1, max_buffer=200):
+        self.container = container
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.text = ""
+        self.frozen = 0
+        self.pending = 0
+        self.renders = 0
+        self.started_at = time.monotonic()
+        self.rendered_at = 0.0
+        self.placeholder = container.empty()
+
+    def write(self, token):
+        self.text += token
+        self.pending += len(token)
+        now = time.monotonic()
+        if self.pending >= self.max_buffer or now - self.rendered_at >= self.interval:
+            self.render(now)
+
+    def render(self, now=None):
+        tail = self.text[self.frozen :]
+        boundary = tail.rfind("\n\n")
+        # 코드 블록 안의 빈 줄에서 끊으면 마크다운이 깨지니 펜스가 닫혀 있을 때만 고정한다
+        if boundary != -1 and tail[:boundary].count("```") % 2 == 0:
+            self.placeholder.markdown(tail[:boundary])
+            self.frozen += boundary + 2
+            self.placeholder = self.container.empty()
+            tail = self.text[self.frozen :]
+        self.placeholder.markdown(tail)
+        self.pending = 0
+        self.renders += 1
+        self.rendered_at = now or time.monotonic()
+
+    def flush(self):
+        if self.pending:
+            self.render()
+
+    def renders_per_second(self):
+        return self.renders / max(time.monotonic() - self.started_at, 1e-9)
+
+
+class ChatCallbackHandler(BaseCallbackHandler):
+    def __init__(self, on_complete=None, interval=0.1, max_buffer=200):
+        self.on_complete = on_complete
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.renderer = None
+
+    @property
+    def message(self):
+        return self.renderer.text if self.renderer else ""
+
+    def on_llm_start(self, *args, **kwargs: Any) -> Any:
+        self.renderer = StreamingRenderer(
+            st.container(), interval=self.interval, max_buffer=self.max_buffer
+        )
+
+    def on_llm_new_token(self, token: str, *args, **kwargs: Any) -> Any:
+        self.renderer.write(token)
+
+    def stream(self, tokens):
+        """Render tokens produced outside the LLM callbacks, e.g. by ``astream``."""
+        self.on_llm_start()
+        for token in tokens:
+            self.on_llm_new_token(token)
+        self.on_llm_end()
+        return self.message
+
+    def replay(self, text, chunk_size=20):
+        """Play a stored answer through the same rendering path as a live one."""
+        return self.stream(
+            text[start : start + chunk_size] for start in range(0, len(text), chunk_size)
+        )
+
+    def on_llm_end(self, *args, **kwargs: Any) -> Any:
+        self.renderer.flush()
+        logger.debug(
+            "Streamed %d characters in %d renders (%.1f renders/s)",
+            len(self.renderer.text),
+            self.renderer.renders,
+            self.renderer.renders_per_second(),
+        )
+        if self.on_complete:
+            self.on_complete(self.renderer.text)
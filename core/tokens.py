@@ -0,0 +1,12 @@
+from functools import lru_cache
+
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name="cl100k_base"):
+    return tiktoken.get_encoding(encoding_name)
+
+
+def count_tokens(text, encoding_name="cl100k_base"):
+    return len(get_encoding(encoding_name).encode(text, disallowed_special=()))
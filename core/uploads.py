@@ -0,0 +1,16 @@
+import streamlit as st
+
+from core import ingest
+
+
+def upload_handle(file):
+    """Return ``(digest, file_path)`` for an upload, hashing it once per session.
+
+    Every chat message reruns the page; keying on the uploader's file id
+    means only the first run reads, hashes and saves the upload.
+    """
+    handles = st.session_state.setdefault("upload_handles", {})
+    file_id = getattr(file, "file_id", None) or (file.name, file.size)
+    if file_id not in handles:
+        handles[file_id] = ingest.save_content(file.getvalue(), file.name)
+    return handles[file_id]
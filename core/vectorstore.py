@@ -0,0 +1,202 @@
+import math
+import os
+import pickle
+import shutil
+import uuid
+
+import faiss
+import numpy as np
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain.vectorstores.faiss import FAISS
+
+
+# 청크 수가 이 값 이상이면 전수 비교 대신 근사 인덱스를 만든다
+ANN_THRESHOLD = 10000
+ANN_INDEX = "ivf"
+HNSW_M = 32
+NPROBE = 16
+EF_SEARCH = 64
+
+_CODECS = {None: "Flat", "fp16": "SQfp16", "int8": "SQ8"}
+
+
+def index_description(count, quantization=None, index_type="auto"):
+    codec = _CODECS[quantization]
+    if index_type == "auto":
+        index_type = ANN_INDEX if count >= ANN_THRESHOLD else "flat"
+    if index_type == "ivf":
+        # faiss는 클러스터당 학습 벡터가 39개 이상이기를 권한다
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        return f"IVF{nlist},{codec}"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}" if codec == "Flat" else f"HNSW{HNSW_M},{codec}"
+    return codec
+
+
+def make_index(dimensions, count, quantization=None, index_type="auto"):
+    description = index_description(count, quantization, index_type)
+    if description == "Flat":
+        # index_factory의 Flat은 디스크에서 다른 타입으로 읽혀 merge_from이 실패한다
+        return faiss.IndexFlatL2(dimensions)
+    return faiss.index_factory(dimensions, description, faiss.METRIC_L2)
+
+
+def tune_index(index, nprobe=None, ef_search=None):
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe or NPROBE
+    except RuntimeError:
+        pass
+    hnsw = getattr(index, "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search or EF_SEARCH
+    return index
+
+
+def build_index(vectors, quantization=None, index_type="auto"):
+    index = make_index(vectors.shape[1], len(vectors), quantization, index_type)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return tune_index(index)
+
+
+def _copy_ivf(index):
+    ivf = faiss.downcast_index(faiss.extract_index_ivf(index))
+    quantizer = faiss.IndexFlatL2(ivf.d)
+    quantizer.add(ivf.quantizer.reconstruct_n(0, ivf.nlist))
+    if isinstance(ivf, faiss.IndexIVFScalarQuantizer):
+        copy = faiss.IndexIVFScalarQuantizer(
+            quantizer, ivf.d, ivf.nlist, ivf.sq.qtype, ivf.metric_type, ivf.by_residual
+        )
+        copy.sq.trained = ivf.sq.trained
+    else:
+        copy = faiss.IndexIVFFlat(quantizer, ivf.d, ivf.nlist, ivf.metric_type)
+    copy.is_trained = True
+    # 코드를 그대로 옮겨서 원래 코덱을 유지하고 다시 양자화하지 않는다
+    for list_no in range(ivf.nlist):
+        size = ivf.invlists.list_size(list_no)
+        if size:
+            copy.invlists.add_entries(
+                list_no, size, ivf.invlists.get_ids(list_no), ivf.invlists.get_codes(list_no)
+            )
+    copy.ntotal = ivf.ntotal
+    return tune_index(copy, nprobe=ivf.nprobe)
+
+
+def copy_index(index):
+    """An in-memory copy of ``index`` that can be merged into and modified."""
+    try:
+        return faiss.clone_index(index)
+    except RuntimeError:
+        # mmap으로 읽은 IVF는 역리스트가 디스크에 있어 복제가 안 되니 리스트를 옮겨 만든다
+        return _copy_ivf(index)
+
+
+def can_merge(index, other):
+    """Whether ``other``'s codes can be appended to ``index`` as they are.
+
+    Only flat-code indexes merge without an id offset. IVF indexes each have
+    their own coarse quantizer, and SQ8 codes depend on each index's training.
+    """
+    if isinstance(index, faiss.IndexFlat) and isinstance(other, faiss.IndexFlat):
+        return index.metric_type == other.metric_type
+    if isinstance(index, faiss.IndexScalarQuantizer) and isinstance(
+        other, faiss.IndexScalarQuantizer
+    ):
+        return index.sq.qtype == other.sq.qtype == faiss.ScalarQuantizer.QT_fp16
+    return False
+
+
+def renumbers_on_remove(index):
+    """Whether ``remove_ids`` shifts later vectors down, as LangChain's delete assumes."""
+    return isinstance(index, faiss.IndexFlatCodes)
+
+
+def index_vectors(index):
+    """Every vector in ``index``, decoded, in id order."""
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()
+    except RuntimeError:
+        pass
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def rebuild_index(index, vectors):
+    """An index with the type and training of ``index`` holding only ``vectors``."""
+    rebuilt = faiss.clone_index(index)
+    rebuilt.reset()
+    if len(vectors):
+        rebuilt.add(vectors)
+    return rebuilt
+
+
+def build_vectorstore(docs, embeddings, quantization=None, index_type="auto"):
+    vectors = np.array(
+        embeddings.embed_documents([doc.page_content for doc in docs]),
+        dtype=np.float32,
+    )
+    index = build_index(vectors, quantization, index_type)
+    ids = [str(uuid.uuid4()) for _ in docs]
+    docstore = InMemoryDocstore(dict(zip(ids, docs)))
+    index_to_docstore_id = dict(enumerate(ids))
+    return FAISS(embeddings, index, docstore, index_to_docstore_id), vectors
+
+
+def recall_at_k(index, vectors, k=4, sample=200):
+    """Share of the exact top-k neighbours that ``index`` also returns.
+
+    Queries are indexed vectors, so each one's own id is left out of both
+    result lists; otherwise every query would find itself.
+    """
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    rng = np.random.default_rng(0)
+    positions = rng.choice(len(vectors), min(sample, len(vectors)), replace=False)
+    k = min(k, len(vectors) - 1)
+    if k < 1:
+        return 1.0
+    _, expected = exact.search(vectors[positions], k + 1)
+    _, found = index.search(vectors[positions], k + 1)
+    hits = 0
+    for position, e, f in zip(positions, expected, found):
+        e = [id for id in e if id != position][:k]
+        f = [id for id in f if id != position][:k]
+        hits += len(set(e) & set(f))
+    return hits / (len(positions) * k)
+
+
+def save_vectorstore(vectorstore, folder, lexical=None):
+    if os.path.exists(folder):
+        return
+    # 다른 워커가 같은 인덱스를 동시에 저장할 수 있으니 임시 폴더에 쓰고 이름만 바꾼다
+    tmp_folder = f"{folder}.{uuid.uuid4().hex}.tmp"
+    vectorstore.save_local(tmp_folder)
+    if lexical is not None:
+        lexical.save(f"{tmp_folder}/lexical.pkl")
+    try:
+        os.rename(tmp_folder, folder)
+    except OSError:
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+
+
+def load_vectorstore(folder, embeddings, mmap=True):
+    """Read a saved index; ``mmap`` keeps IVF inverted lists on disk."""
+    index_path = f"{folder}/index.faiss"
+    if not os.path.exists(index_path):
+        return None
+    index = None
+    if mmap:
+        # faiss 1.7.4의 mmap은 IVF 역리스트만 매핑한다. Flat 인덱스는 이 플래그로
+        # 읽어도 전부 메모리에 올라가므로 워커끼리 공유되지 않는다
+        try:
+            index = faiss.read_index(
+                index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+        except RuntimeError:
+            index = None
+    if index is None:
+        index = faiss.read_index(index_path)
+    tune_index(index)
+    with open(f"{folder}/index.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
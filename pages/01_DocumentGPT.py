@@ -1,72 +1,93 @@
 import time
-from typing import Any, Dict, List, Optional, Union
-from uuid import UUID
-from langchain.document_loaders import UnstructuredFileLoader
-from langchain.embeddings import CacheBackedEmbeddings, OpenAIEmbeddings
-from langchain.schema.output import ChatGenerationChunk, GenerationChunk
-from langchain.storage import LocalFileStore
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.schema.runnable import RunnableLambda, RunnablePassthrough
-from langchain.vectorstores.faiss import FAISS
+from langchain.embeddings import OpenAIEmbeddings
+from langchain.schema.runnable import RunnablePassthrough
 from langchain.prompts import ChatPromptTemplate
 from langchain.chat_models import ChatOpenAI
-from langchain.callbacks.base import BaseCallbackHandler
 import streamlit as st
+from core import ingest, runtime
+from core.answer_cache import get_answer_cache
+from core.collection import DocumentCollection
+from core.context import context_packer
+from core.embeddings import get_query_embeddings
+from core.quantize import QUANTIZATIONS
+from core.streaming import ChatCallbackHandler
+from core.uploads import upload_handle
 
 st.set_page_config(
     page_title="DocumentGPT",
     page_icon="📃",
 )
 
-class ChatCallbackHandler(BaseCallbackHandler):
-
-    message= ""
-
-    def on_llm_start(self, *args, **kwargs: Any) -> Any:
-        self.message_box= st.empty()
-
-    def on_llm_end(self, *args, **kwargs: Any) -> Any:
-        save_message(self.message, "ai")
-        with st.sidebar:
-            st.write("llm ended!")
-
-    def on_llm_new_token(self, token: str, *args, **kwargs: Any) -> Any:
-        self.message += token
-        self.message_box.markdown(self.message)
+def on_llm_end(message):
+    save_message(message, "ai")
+    with st.sidebar:
+        st.write("llm ended!")
 
 
+# 토큰은 공유 이벤트 루프에서 받아 스크립트 스레드에서 그린다
+handler = ChatCallbackHandler(on_complete=on_llm_end)
 
 llm = ChatOpenAI(
     temperature=0.1,
     streaming=True,
-    callbacks=[
-        ChatCallbackHandler(),
-    ]
 )
 
 
+def answer(chain, message):
+    return handler.stream(
+        chunk.content for chunk in runtime.stream(chain, message, "openai")
+    )
+
+embeddings = get_query_embeddings("openai", OpenAIEmbeddings())
+
+answer_cache = get_answer_cache("openai")
+
+
 if "messages" not in st.session_state:
     st.session_state["messages"] = []
 
-@st.cache_data(show_spinner="Embedding file...")
-def embed_file(file):
-    file_content = file.read()
-    file_path = f"./.cache/files/{file.name}"
-    with open(file_path, "wb") as f:
-        f.write(file_content)
-    cache_dir = LocalFileStore(f"./.cache/embeddings/{file.name}")
-    splitter = CharacterTextSplitter.from_tiktoken_encoder(
-        separator="\n",
-        chunk_size=600,
-        chunk_overlap=100,
-    )
-    loader = UnstructuredFileLoader(file_path)
-    docs = loader.load_and_split(text_splitter=splitter)
-    embeddings = OpenAIEmbeddings()
-    cached_embeddings = CacheBackedEmbeddings.from_bytes_store(embeddings, cache_dir)
-    vectorstore = FAISS.from_documents(docs, cached_embeddings)
-    retriever = vectorstore.as_retriever()
-    return retriever
+if "collection" not in st.session_state:
+    st.session_state["collection"] = DocumentCollection(cache=ingest.cache)
+
+
+def embed_files(files, quantization):
+    collection = st.session_state["collection"]
+    digests = set()
+    for file in files:
+        digest, file_path = upload_handle(file)
+        if digest not in collection:
+            collection.start(
+                ingest.IngestionJob(
+                    digest,
+                    file_path,
+                    file.name,
+                    embeddings,
+                    namespace="openai",
+                    quantization=quantization,
+                )
+            )
+        digests.add(digest)
+    collection.retain(digests)
+    collection.poll()
+    return collection
+
+
+def paint_progress(collection):
+    with st.sidebar:
+        metrics = ingest.cache.metrics()
+        st.caption(
+            f"Index cache: {(metrics['bytes'] + metrics['reserved_bytes']) / 1024**2:.0f}"
+            f" of {metrics['max_bytes'] / 1024**2:.0f} MB,"
+            f" {metrics['hits']} hits, {metrics['misses']} misses,"
+            f" {metrics['evictions']} evictions"
+        )
+        for job in collection.pending():
+            st.progress(
+                job.progress(),
+                text=f"Embedding {job.name}: {job.indexed} chunks searchable",
+            )
+        for job in collection.failed.values():
+            st.error(f"Could not embed {job.name}: {job.error}")
 
 def save_message(message, role):
     st.session_state["messages"].append({"message":message, "role": role})
@@ -87,9 +108,6 @@ def paint_history():
             save=False,
         )
 
-def format_docs(docs):
-    return "\n\n".join(document.page_content for document in docs)
-
 
 prompt = ChatPromptTemplate.from_messages(
     [
@@ -118,27 +136,61 @@ Upload your files on the sidebar.
 )
 
 with st.sidebar:
-    file = st.file_uploader(
-        "Upload a .txt .pdf or .docx file",
+    # fp16/int8은 임베딩 캐시와 인덱스를 각각 1/2, 1/4 크기로 줄인다
+    quantization = st.selectbox(
+        "Vector precision",
+        (None, *QUANTIZATIONS),
+        format_func=lambda quantization: quantization or "float32",
+    )
+    files = st.file_uploader(
+        "Upload .txt .pdf or .docx files",
         type=["pdf", "txt", "docx"],
+        accept_multiple_files=True,
     )
 
-if file:
-    retriever = embed_file(file)
+# 정밀도가 다른 인덱스는 한 컬렉션에 섞지 않는다
+if st.session_state.get("quantization") != quantization:
+    st.session_state["quantization"] = quantization
+    st.session_state["collection"] = DocumentCollection(cache=ingest.cache)
 
-    send_message("I'm ready.", "ai", save=False)
+if files:
+    collection = embed_files(files, quantization)
+    paint_progress(collection)
+
+    if collection.ready():
+        send_message("I'm ready.", "ai", save=False)
     paint_history()
-    message = st.chat_input("Ask anything about your file")
+    message = st.chat_input(
+        "Ask anything about your file",
+        disabled=not collection.ready(),
+    )
 
     if message:
         send_message(message, "human")
         chain = {
-            "context" : retriever | RunnableLambda(format_docs),
+            "context" : context_packer(collection.search, llm.model_name),
             "question": RunnablePassthrough()
         } | prompt | llm
 
         with st.chat_message("ai"):
-            response = chain.invoke(message)
-        
+            # 인덱싱 중에는 검색 결과가 계속 바뀌니 답을 캐시하지 않는다
+            if collection.pending():
+                answer(chain, message)
+            else:
+                question_vector = embeddings.embed_query(message)
+                cached_answer = answer_cache.lookup(collection.key(), question_vector)
+                if cached_answer is not None:
+                    handler.replay(cached_answer)
+                else:
+                    answer_cache.store(
+                        collection.key(), question_vector, answer(chain, message)
+                    )
+
+    # 인덱싱이 끝날 때까지 진행 상황을 다시 그린다
+    if collection.pending():
+        time.sleep(1)
+        st.rerun()
+
 else:
-    st.session_state["messages"] = []
\ No newline at end of file
+    st.session_state["messages"] = []
+    st.session_state["collection"] = DocumentCollection(cache=ingest.cache)
\ No newline at end of file
@@ -1,13 +1,14 @@
 from langchain.prompts import ChatPromptTemplate
-from langchain.document_loaders import UnstructuredFileLoader
-from langchain.embeddings import CacheBackedEmbeddings, OllamaEmbeddings
-from langchain.schema.runnable import RunnableLambda, RunnablePassthrough
-from langchain.storage import LocalFileStore
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores.faiss import FAISS
+from langchain.embeddings import OllamaEmbeddings
+from langchain.schema.runnable import RunnablePassthrough
 from langchain.chat_models import ChatOllama
-from langchain.callbacks.base import BaseCallbackHandler
 import streamlit as st
+from core import ingest, runtime
+from core.answer_cache import get_answer_cache
+from core.context import context_packer
+from core.embeddings import embed_query_within, get_query_embeddings
+from core.streaming import ChatCallbackHandler
+from core.uploads import upload_handle
 
 st.set_page_config(
     page_title="PrivateGPT",
@@ -15,50 +16,35 @@ st.set_page_config(
 )
 
 
-class ChatCallbackHandler(BaseCallbackHandler):
-    message = ""
-
-    def on_llm_start(self, *args, **kwargs):
-        self.message_box = st.empty()
-
-    def on_llm_end(self, *args, **kwargs):
-        save_message(self.message, "ai")
-
-    def on_llm_new_token(self, token, *args, **kwargs):
-        self.message += token
-        self.message_box.markdown(self.message)
-
+handler = ChatCallbackHandler(on_complete=lambda message: save_message(message, "ai"))
 
 llm = ChatOllama(
     model="mistral:latest",
     num_gpu=1,
     temperature=0.1,
     streaming=True,
-    callbacks=[
-        ChatCallbackHandler(),
-    ],
 )
 
+embeddings = get_query_embeddings(
+    "ollama-mistral", OllamaEmbeddings(model="mistral:latest", num_gpu=1)
+)
 
-@st.cache_data(show_spinner="Embedding file...")
-def embed_file(file):
-    file_content = file.read()
-    file_path = f"./.cache/private_files/{file.name}"
-    with open(file_path, "wb") as f:
-        f.write(file_content)
-    cache_dir = LocalFileStore(f"./.cache/private_embeddings/{file.name}")
-    splitter = CharacterTextSplitter.from_tiktoken_encoder(
-        separator="\n",
-        chunk_size=600,
-        chunk_overlap=100,
-    )
-    loader = UnstructuredFileLoader(file_path)
-    docs = loader.load_and_split(text_splitter=splitter)
-    embeddings = OllamaEmbeddings(model="mistral:latest", num_gpu=1)
-    cached_embeddings = CacheBackedEmbeddings.from_bytes_store(embeddings, cache_dir)
-    vectorstore = FAISS.from_documents(docs, cached_embeddings)
-    retriever = vectorstore.as_retriever()
-    return retriever
+answer_cache = get_answer_cache("ollama-mistral")
+
+# 로컬 임베딩이 이보다 늦으면 벡터 검색과 답변 캐시를 건너뛴다
+VECTOR_TIMEOUT = 5
+
+
+def embed_file(digest, file_path):
+    # 로컬 임베딩이 밀려 있으면 키워드 검색 결과만으로 답한다
+    with st.spinner("Embedding file..."):
+        return ingest.hybrid_file(
+            digest,
+            file_path,
+            embeddings,
+            namespace="ollama-mistral",
+            vector_timeout=VECTOR_TIMEOUT,
+        )
 
 
 def save_message(message, role):
@@ -81,9 +67,6 @@ def paint_history():
         )
 
 
-def format_docs(docs):
-    return "\n\n".join(document.page_content for document in docs)
-
 
 prompt = ChatPromptTemplate.from_template(
     """Answer the question using ONLY the following context and not your training data. If you don't know the answer just say you don't know. DON'T make anything up.
@@ -113,7 +96,8 @@ with st.sidebar:
     )
 
 if file:
-    retriever = embed_file(file)
+    digest, file_path = upload_handle(file)
+    search = embed_file(digest, file_path)
     send_message("I'm ready! Ask away!", "ai", save=False)
     paint_history()
     message = st.chat_input("Ask anything about your file...")
@@ -121,14 +105,26 @@ if file:
         send_message(message, "human")
         chain = (
             {
-                "context": retriever | RunnableLambda(format_docs),
+                "context": context_packer(search, llm.model),
                 "question": RunnablePassthrough(),
             }
             | prompt
             | llm
         )
         with st.chat_message("ai"):
-            chain.invoke(message)
+            # 임베딩이 밀려 있으면 캐시 없이 바로 BM25 폴백 경로로 답한다
+            question_vector = embed_query_within(embeddings, message, VECTOR_TIMEOUT)
+            answer = None
+            if question_vector is not None:
+                answer = answer_cache.lookup(digest, question_vector)
+            if answer is not None:
+                handler.replay(answer)
+            else:
+                # ChatOllama는 비동기 스트림이 없어서 루프의 executor에서 스트리밍한다
+                chunks = runtime.stream(chain, message, "ollama", native_async=False)
+                answer = handler.stream(chunk.content for chunk in chunks)
+                if question_vector is not None:
+                    answer_cache.store(digest, question_vector, answer)
 
 
 else:
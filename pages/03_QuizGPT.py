@@ -1,19 +1,12 @@
-from langchain.document_loaders import UnstructuredFileLoader
-from langchain.text_splitter import CharacterTextSplitter
 from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
-from langchain.callbacks import StreamingStdOutCallbackHandler
+import logging
 import streamlit as st
+from core import ingest, quiz, runtime
+from core.uploads import upload_handle
 from langchain.retrievers import WikipediaRetriever
-from langchain.schema import BaseOutputParser
-import json
 
-class JsonOutputParser(BaseOutputParser):
-    def parse(self, text):
-        text = text.replace("```", "").replace("json","")
-        return json.loads(text)
-    
-output_parser = JsonOutputParser()
+logger = logging.getLogger(__name__)
 
 st.set_page_config(
     page_title="QuizGPT",
@@ -25,8 +18,6 @@ st.title("QuizGPT")
 llm = ChatOpenAI(
     temperature=0.1,
     model="gpt-3.5-turbo-1106",
-    streaming=True,
-    callbacks=[StreamingStdOutCallbackHandler()],
 )
 
 def format_docs(docs):
@@ -67,154 +58,33 @@ questions_prompt = ChatPromptTemplate.from_messages(
         ]
     )
 
-questions_chain = {"context": format_docs} | questions_prompt | llm
-
-formatting_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            """
-    You are a powerful formatting algorithm.
-     
-    You format exam questions into JSON format.
-    Answers with (o) are the correct ones.
-     
-    Example Input:
-
-    Question: What is the color of the ocean?
-    Answers: Red|Yellow|Green|Blue(o)
-         
-    Question: What is the capital or Georgia?
-    Answers: Baku|Tbilisi(o)|Manila|Beirut
-         
-    Question: When was Avatar released?
-    Answers: 2007|2001|2009(o)|1998
-         
-    Question: Who was Julius Caesar?
-    Answers: A Roman Emperor(o)|Painter|Actor|Model
-    
-     
-    Example Output:
-     
-    ```json
-    {{ "questions": [
-            {{
-                "question": "What is the color of the ocean?",
-                "answers": [
-                        {{
-                            "answer": "Red",
-                            "correct": false
-                        }},
-                        {{
-                            "answer": "Yellow",
-                            "correct": false
-                        }},
-                        {{
-                            "answer": "Green",
-                            "correct": false
-                        }},
-                        {{
-                            "answer": "Blue",
-                            "correct": true
-                        }},
-                ]
-            }},
-                        {{
-                "question": "What is the capital or Georgia?",
-                "answers": [
-                        {{
-                            "answer": "Baku",
-                            "correct": false
-                        }},
-                        {{
-                            "answer": "Tbilisi",
-                            "correct": true
-                        }},
-                        {{
-                            "answer": "Manila",
-                            "correct": false
-                        }},
-                        {{
-                            "answer": "Beirut",
-                            "correct": false
-                        }},
-                ]
-            }},
-                        {{
-                "question": "When was Avatar released?",
-                "answers": [
-                        {{
-                            "answer": "2007",
-                            "correct": false
-                        }},
-                        {{
-                            "answer": "2001",
-                            "correct": false
-                        }},
-                        {{
-                            "answer": "2009",
-                            "correct": true
-                        }},
-                        {{
-                            "answer": "1998",
-                            "correct": false
-                        }},
-                ]
-            }},
-            {{
-                "question": "Who was Julius Caesar?",
-                "answers": [
-                        {{
-                            "answer": "A Roman Emperor",
-                            "correct": true
-                        }},
-                        {{
-                            "answer": "Painter",
-                            "correct": false
-                        }},
-                        {{
-                            "answer": "Actor",
-                            "correct": false
-                        }},
-                        {{
-                            "answer": "Model",
-                            "correct": false
-                        }},
-                ]
-            }}
-        ]
-     }}
-    ```
-    Your turn!
-
-    Questions: {context}
+# 함수 호출로 퀴즈 스키마를 한 번에 받고, 실패하면 같은 프롬프트의 텍스트 답을 읽는다
+questions_chain = {"context": format_docs} | quiz.quiz_chain(questions_prompt, llm)
 
-""",
-        )
-    ]
-)
+def split_file(file):
+    digest, file_path = upload_handle(file)
+    with st.spinner("Loading file..."):
+        return digest, ingest.split_file(file_path, digest)
 
-formatting_chain = formatting_prompt | llm
+# 이보다 긴 입력은 청크 묶음마다 문제를 따로 만들고 합친다
+STUFF_TOKENS = 6000
+GROUP_TOKENS = 3000
 
-@st.cache_data(show_spinner="Loading file...")
-def split_file(file):
-    file_content = file.read()
-    file_path = f"./.cache/quiz_files/{file.name}"
-    with open(file_path, "wb") as f:
-        f.write(file_content)
-    splitter = CharacterTextSplitter.from_tiktoken_encoder(
-        separator="\n",
-        chunk_size=600,
-        chunk_overlap=100,
-    )
-    loader = UnstructuredFileLoader(file_path)
-    docs = loader.load_and_split(text_splitter=splitter)
-    return docs
 
 @st.cache_data(show_spinner="Making quiz...")
-def run_quiz_chain(_docs, topic):
-    chain = {"context": questions_chain} | formatting_chain | output_parser
-    return chain.invoke(_docs)
+def run_quiz_chain(_docs, key):
+    if quiz.docs_tokens(_docs) <= STUFF_TOKENS:
+        return runtime.invoke(questions_chain, _docs, "openai")
+    groups = quiz.group_docs(_docs, GROUP_TOKENS)
+    results = runtime.batch(questions_chain, groups, "openai", return_exceptions=True)
+    # 실패한 묶음은 빼고, 모든 묶음이 실패했을 때만 에러를 낸다
+    quizzes = [result for result in results if not isinstance(result, Exception)]
+    if not quizzes:
+        raise results[0]
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning("Making quiz questions for a group failed: %s", result)
+    return quiz.pick_questions(quizzes, 10)
 
 
 @st.cache_data(show_spinner="Searching Wikipedia...")
@@ -225,6 +95,7 @@ def wiki_search(term):
 
 with st.sidebar:
     docs = None
+    key = None
     choice = st.selectbox(
         "Choose what you want to use.",
         (
@@ -238,11 +109,12 @@ with st.sidebar:
             type=["pdf", "txt", "docx"],
         )
         if file:
-            docs = split_file(file)
+            # 같은 이름의 다른 파일이 캐시된 퀴즈를 받지 않도록 내용 해시로 캐시한다
+            key, docs = split_file(file)
     else:
         topic = st.text_input("Search Wikipedia...")
         if topic:
-            docs = wiki_search(topic)
+            key, docs = topic, wiki_search(topic)
 
 if not docs:
     st.markdown(
@@ -255,7 +127,7 @@ if not docs:
     """
     )
 else:
-    response = run_quiz_chain(docs, topic if topic else file.name)
+    response = run_quiz_chain(docs, key)
     with st.form("questions_form"):
         for question in response["questions"]:
             st.write(question["question"])
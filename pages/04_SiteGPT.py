@@ -1,39 +1,57 @@
-from langchain.document_loaders import SitemapLoader, text
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.chat_models import ChatOpenAI
+from langchain.embeddings import OpenAIEmbeddings
 import streamlit as st
+from core import rerank, runtime
+from core.crawler import SitemapCrawler
+from core.extract import Extractor
+from core.sites import SiteIndex
+from core.splitter import get_recursive_splitter
+from core.streaming import ChatCallbackHandler
 
 
-def parse_page(soup):
-    header = soup.find("header")
-    footer = soup.find("footer")
-    if header:
-        header.decompose()
-    if footer:
-        footer.decompose()
-    return (
-        str(soup.get_text())
-        .replace("\n", " ")
-        .replace("\xa0", " ")
-        .replace("CloseSearch Submit Blog", "")
+# 사이트별 상용구 규칙은 core.extract.SITE_RULES에 둔다
+extractor = Extractor(backend="lxml")
+
+# 청크마다 점수를 매기는 호출은 한꺼번에 보내고 최종 답만 스트리밍한다
+answer_chain = rerank.answer_chain(
+    ChatOpenAI(
+        temperature=0.1,
+        model="gpt-3.5-turbo-1106",
     )
+)
+
+llm = ChatOpenAI(
+    temperature=0.1,
+    streaming=True,
+)
 
+handler = ChatCallbackHandler()
 
-@st.cache_data(show_spinner="Loading website...")
-def load_website(url):
-    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=1000,
-        chunk_overlap=200,
-    )
-    loader = SitemapLoader(
-        url,
-        filter_urls=[
-            r"^(.*\/blog\/).*",
-        ],
-        parsing_function=parse_page,
-    )
-    loader.requests_per_second = 2
-    docs = loader.load_and_split(text_splitter=splitter)
-    return docs
+
+@st.cache_resource(show_spinner="Loading website...")
+def get_site(url):
+    return SiteIndex(url, OpenAIEmbeddings(), namespace="openai")
+
+
+def load_website(url, refresh=False):
+    site = get_site(url)
+    if refresh or site.stale():
+        splitter = get_recursive_splitter(chunk_size=1000, chunk_overlap=200)
+        crawler = SitemapCrawler(
+            filter_urls=[
+                r"^(.*\/blog\/).*",
+            ],
+            parsing_function=extractor,
+        )
+        # 바뀐 페이지만 다시 자르고 임베딩한다
+        with st.spinner("Crawling website..."):
+            stats = site.update(crawler, splitter)
+        with st.sidebar:
+            st.caption(
+                f"{stats['pages']} pages, {stats['changed']} updated, "
+                f"{stats['removed']} removed"
+            )
+    return site
 
 
 st.set_page_config(
@@ -65,5 +83,34 @@ if url:
         with st.sidebar:
             st.error("Please write down a Sitemap URL.")
     else:
-        docs = load_website(url)
-        st.write(docs)
\ No newline at end of file
+        with st.sidebar:
+            refresh = st.button("Refresh website")
+        site = load_website(url, refresh=refresh)
+        query = st.text_input("Ask a question to the website.")
+        if query:
+            docs = [doc for doc, _ in site.search(query, k=8)]
+            with st.spinner("Reading pages..."):
+                answers = rerank.map_rerank(docs, query, answer_chain)
+            if not answers:
+                st.markdown("I couldn't find the answer on this website.")
+            else:
+                chain = rerank.choose_prompt | llm
+                handler.stream(
+                    chunk.content
+                    for chunk in runtime.stream(
+                        chain,
+                        {
+                            "question": query,
+                            "answers": rerank.format_answers(answers),
+                        },
+                        "openai",
+                    )
+                )
+                st.caption(
+                    " · ".join(
+                        f"[{source}]({source})"
+                        for source in dict.fromkeys(
+                            answer["source"] for answer in answers
+                        )
+                    )
+                )
\ No newline at end of file
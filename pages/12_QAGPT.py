@@ -1,16 +1,14 @@
 from langchain.prompts import ChatPromptTemplate
-from langchain.document_loaders import UnstructuredFileLoader
-from langchain.embeddings import CacheBackedEmbeddings, OpenAIEmbeddings
-from langchain.schema.runnable import RunnableLambda, RunnablePassthrough
-from langchain.storage import LocalFileStore
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores.faiss import FAISS
+from langchain.embeddings import OpenAIEmbeddings
+from langchain.schema.runnable import RunnablePassthrough
 from langchain.chat_models import ChatOpenAI
-from langchain.callbacks.base import BaseCallbackHandler
 from langchain.document_loaders import UnstructuredHTMLLoader
 from langchain.schema import BaseOutputParser
 import json
 import streamlit as st
+from core import ingest, runtime
+from core.context import context_packer
+from core.streaming import ChatCallbackHandler
 from dotenv import load_dotenv
 load_dotenv()
 class JsonOutputParser(BaseOutputParser):
@@ -20,45 +18,27 @@ class JsonOutputParser(BaseOutputParser):
     
 output_parser = JsonOutputParser()
 
-class ChatCallbackHandler(BaseCallbackHandler):
-    message = ""
-
-    def on_llm_start(self, *args, **kwargs):
-        self.message_box = st.empty()
-
-    def on_llm_end(self, *args, **kwargs):
-        save_message(self.message, "ai")
-
-    def on_llm_new_token(self, token, *args, **kwargs):
-        self.message += token
-        self.message_box.markdown(self.message)
-
+handler = ChatCallbackHandler(on_complete=lambda message: save_message(message, "ai"))
 
 llm = ChatOpenAI(
     temperature=0.1,
     model="gpt-4",
     streaming=True,
-    callbacks=[
-        ChatCallbackHandler(),
-    ],
 )
 
 
 @st.cache_resource(show_spinner="Embedding file...")
 def embed_file():
-    cache_dir = LocalFileStore(f".cache/embeddings/case1")
-    loader = UnstructuredHTMLLoader('case1.html')
-    splitter = CharacterTextSplitter.from_tiktoken_encoder(
-        separator="\n",
-        chunk_size=600,
-        chunk_overlap=100,
+    with open("case1.html", "rb") as f:
+        content = f.read()
+    vectorstore = ingest.ingest(
+        content,
+        "case1.html",
+        OpenAIEmbeddings(),
+        namespace="openai",
+        loader_cls=UnstructuredHTMLLoader,
     )
-    docs = loader.load_and_split(text_splitter=splitter)
-    embeddings = OpenAIEmbeddings()
-    cached_embeddings = CacheBackedEmbeddings.from_bytes_store(embeddings, cache_dir)
-    vectorstore = FAISS.from_documents(docs, cached_embeddings)
-    retriever = vectorstore.as_retriever()
-    return retriever
+    return vectorstore.as_retriever()
 
 
 def save_message(message, role):
@@ -81,13 +61,7 @@ def paint_history():
         )
 
 
-def format_docs(docs):
-    return "\n\n".join(document.page_content for document in docs)
-
-def makePythonFile(input):
-    # response에서 content 필드 추출
-    content = input.content
-
+def makePythonFile(content):
     # Python 코드 추출
     # "```python"과 "```" 사이의 내용을 추출
     start = content.find("```python") + len("```python\n")
@@ -140,14 +114,18 @@ paint_history()
 if choice != "":
     chain = (
         {
-            "context": retriever | RunnableLambda(format_docs),
+            "context": context_packer(
+                retriever.vectorstore.similarity_search_with_score, llm.model_name
+            ),
             "question": RunnablePassthrough(),
         }
         | prompt
         | llm
     )
     with st.chat_message("ai"):
-        response = chain.invoke(choice)
+        response = handler.stream(
+            chunk.content for chunk in runtime.stream(chain, choice, "openai")
+        )
         file_name = makePythonFile(response)
         with open(file_name, "r", encoding="utf-8") as file:
             exec(file.read())
\ No newline at end of file
@@ -1,50 +1,203 @@
+import asyncio
+import atexit
+import functools
+import threading
+
 from langchain.agents import initialize_agent, AgentType
 from langchain.tools import StructuredTool
-from playwright.async_api import async_playwright
+from playwright.async_api import Error, async_playwright
 
 path = "example.png"
 data =""
 
-async def get_page():
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        page = await browser.new_page()
-        return page, browser
-
-async def click_action(selector):
-    page, browser = await get_page()
-    await page.click(selector)
-    await page.screenshot(path=path)
-    return page
-
-async def input_action(selector, text):
-    page, browser = await get_page()
-    await page.fill(selector, text)
-    await page.screenshot(path=path)
-    return page
-
-async def navigate_action(url):
-    page, browser = await get_page()
-    await page.goto(url)
-    await page.screenshot(path=path)
-    return page
-
-async def wait_for_selector_action(selector):
-    page, browser = await get_page()
-    await page.wait_for_selector(selector)
-    await page.screenshot(path=path)
-    return page
-
-
-async def login_action(url, username_selector, username, password_selector, password, login_button_selector):
-    page, browser = await get_page()
-    await page.goto(url)
-    await page.fill(username_selector, username)
-    await page.fill(password_selector, password)
-    await page.click(login_button_selector)
-    await page.screenshot(path=path)
-    return page
-    
+# 동시에 돌 수 있는 에이전트 실행 수 (실행마다 브라우저 컨텍스트 하나)
+POOL_SIZE = 2
+# 풀을 만들 때 미리 띄워 둘 컨텍스트 수
+WARM_CONTEXTS = 1
+
+
+class BrowserPool:
+    """One Chromium shared by every agent run, with a bounded set of contexts.
+
+    Playwright objects belong to the event loop that created them, so the
+    pool owns a loop on its own thread and every browser call is sent there.
+    Each run gets a fresh context; a used one is closed on release so runs
+    never share cookies or storage, and a replacement is warmed up in its
+    place.
+    """
+
+    def __init__(self, size=POOL_SIZE, headless=True):
+        self.size = size
+        self.headless = headless
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.playwright = None
+        self.browser = None
+        self.idle = []
+        self.slots = None
+        self.lock = None
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def sync(self, method):
+        """Blocking version of a coroutine method, run on the pool's loop."""
+
+        @functools.wraps(method)
+        def run(*args, **kwargs):
+            return self.run(method(*args, **kwargs))
+
+        return run
+
+    def wrap(self, method):
+        """Coroutine method that can be awaited from any other event loop."""
+
+        @functools.wraps(method)
+        async def run(*args, **kwargs):
+            return await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(method(*args, **kwargs), self.loop)
+            )
+
+        return run
+
+    async def start(self, warm=WARM_CONTEXTS):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+            self.slots = asyncio.Semaphore(self.size)
+        async with self.lock:
+            if self.browser is None or not self.browser.is_connected():
+                # 브라우저가 죽었으면 남은 컨텍스트도 쓸 수 없다
+                self.idle = []
+                if self.playwright is None:
+                    self.playwright = await async_playwright().start()
+                self.browser = await self.playwright.chromium.launch(
+                    headless=self.headless
+                )
+            while len(self.idle) < min(warm, self.size):
+                self.idle.append(await self._new_context())
+
+    async def _new_context(self):
+        context = await self.browser.new_context()
+        await context.new_page()
+        return context
+
+    async def acquire(self):
+        await self.start(warm=0)
+        await self.slots.acquire()
+        try:
+            if self.idle:
+                return self.idle.pop()
+            return await self._new_context()
+        except Exception:
+            self.slots.release()
+            raise
+
+    async def release(self, context):
+        try:
+            await context.close()
+            if self.browser.is_connected() and not self.idle:
+                self.idle.append(await self._new_context())
+        except Error:
+            # 브라우저가 죽었으면 다음 acquire가 다시 띄운다
+            pass
+        finally:
+            self.slots.release()
+
+    async def _close(self):
+        for context in self.idle:
+            await context.close()
+        self.idle = []
+        if self.browser is not None:
+            await self.browser.close()
+            self.browser = None
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+
+    def close(self):
+        if self.loop.is_running():
+            try:
+                self.run(self._close())
+            finally:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """The process-wide pool; Chromium starts launching as soon as it exists."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            asyncio.run_coroutine_threadsafe(_pool.start(), _pool.loop)
+            atexit.register(_pool.close)
+        return _pool
+
+
+class BrowserSession:
+    """The context and page one agent run drives across all its tool calls."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.context = None
+
+    async def page(self):
+        if self.context is None:
+            self.context = await self.pool.acquire()
+        if not self.context.pages:
+            await self.context.new_page()
+        return self.context.pages[0]
+
+    async def close(self):
+        if self.context is not None:
+            context, self.context = self.context, None
+            await self.pool.release(context)
+
+    async def click_action(self, selector):
+        page = await self.page()
+        await page.click(selector)
+        await page.screenshot(path=path)
+        return f"Clicked {selector}. Current URL: {page.url}"
+
+    async def input_action(self, selector, text):
+        page = await self.page()
+        await page.fill(selector, text)
+        await page.screenshot(path=path)
+        return f"Filled {selector}. Current URL: {page.url}"
+
+    async def navigate_action(self, url):
+        page = await self.page()
+        await page.goto(url)
+        await page.screenshot(path=path)
+        return f"Navigated to {page.url}"
+
+    async def wait_for_selector_action(self, selector):
+        page = await self.page()
+        await page.wait_for_selector(selector)
+        await page.screenshot(path=path)
+        return f"{selector} is on the page. Current URL: {page.url}"
+
+    async def login_action(self, url, username_selector, username, password_selector, password, login_button_selector):
+        page = await self.page()
+        await page.goto(url)
+        await page.fill(username_selector, username)
+        await page.fill(password_selector, password)
+        await page.click(login_button_selector)
+        await page.screenshot(path=path)
+        return f"Submitted the login form. Current URL: {page.url}"
+
+
+def session_tool(session, method, name, description):
+    return StructuredTool.from_function(
+        func=session.pool.sync(method),
+        coroutine=session.pool.wrap(method),
+        name=name,
+        description=description,
+    )
+
 # def click_action(selector):
 #     global data
 #     data += f'''
@@ -100,7 +253,8 @@ async def login_action(url, username_selector, username, password_selector, pass
 #     global data
 #     return data
 
-def create_agent(llm):
+def create_agent(llm, session):
+    # 세션은 호출한 쪽이 닫아야 풀에 컨텍스트가 돌아간다 (run_agent 참고)
     agent = initialize_agent(
         llm=llm, 
         verbose=True,
@@ -114,32 +268,36 @@ def create_agent(llm):
             #     Use this tool to start a browser session and get a page object for further operations.
             #     """,
             # ),
-            StructuredTool.from_function(
-                func=click_action,
+            session_tool(
+                session,
+                session.click_action,
                 name="click action tool",
                 description="""
                 This tool performs a click action on a specified element on the web page. 
                 Provide the selector of the element to perform the click.
                 """,
             ), 
-            StructuredTool.from_function(
-                func=input_action,
+            session_tool(
+                session,
+                session.input_action,
                 name="input action tool",
                 description="""
                 This tool inputs text into a specified field on a web page. 
                 Provide the selector of the input field and the text to be entered.
                 """,
             ),
-            StructuredTool.from_function(
-                func=navigate_action,
+            session_tool(
+                session,
+                session.navigate_action,
                 name="navigation action tool",
                 description="""
                 This tool navigates to a specified URL. 
                 Provide the URL to navigate to.
                 """,
             ),
-            StructuredTool.from_function(
-                func=wait_for_selector_action,
+            session_tool(
+                session,
+                session.wait_for_selector_action,
                 name="wait for selector action tool",
                 description="""
                 This tool waits for a specified element to be present on the web page before performing further actions.
@@ -148,4 +306,13 @@ def create_agent(llm):
             )
         ],   
     )
-    return agent
\ No newline at end of file
+    return agent
+
+
+def run_agent(llm, prompt, pool=None):
+    """Run one agent on a pooled browser context and hand it back afterwards."""
+    session = BrowserSession(pool or get_browser_pool())
+    try:
+        return create_agent(llm, session).invoke(prompt)
+    finally:
+        session.pool.run(session.close())
@@ -1,4 +1,4 @@
-from actions.my_agent import create_agent
+from actions.my_agent import run_agent
 from langchain.chat_models import ChatOpenAI
 import os
 
@@ -12,13 +12,11 @@ llm = ChatOpenAI(
     )
 
 # create_pytest()
-agent = create_agent(llm)
-
 prompt = """
 go to ai.matamath.net and login id : 23-10101, pw : 12345
 """
 
-agent.invoke(prompt)
+run_agent(llm, prompt)
 
 
 # text = make_file()
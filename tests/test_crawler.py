@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from benchmarks import fake_site_server
+from core.crawler import CrawlState, SitemapCrawler
+
+
+@pytest.fixture
+def start_site():
+    servers = []
+
+    def start(**options):
+        server = fake_site_server.serve(port=0, **options)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def crawl(crawler, sitemap_url, state=None):
+    async def collect():
+        return [doc async for doc in crawler.crawl(sitemap_url, state=state)]
+
+    return asyncio.run(collect())
+
+
+def page_requests():
+    return [
+        (t, path, status)
+        for t, path, status in fake_site_server.Handler.requests
+        if path.startswith("/blog/")
+    ]
+
+
+def remember(state, docs):
+    # SiteIndex가 바뀐 페이지마다 하는 것처럼 검증자를 기록한다
+    for doc in docs:
+        state.update(
+            doc.metadata["source"],
+            content_hash=doc.metadata["content_hash"],
+            lastmod=doc.metadata.get("lastmod"),
+            etag=doc.metadata.get("etag"),
+        )
+
+
+def test_skips_urls_disallowed_by_robots(start_site):
+    base_url = start_site(pages=3, disallow="/blog/post-1")
+    crawler = SitemapCrawler()
+
+    docs = crawl(crawler, f"{base_url}/sitemap.xml")
+
+    assert {doc.metadata["source"] for doc in docs} == {
+        f"{base_url}/blog/post-0",
+        f"{base_url}/blog/post-2",
+    }
+    assert "/blog/post-1" not in [path for _, path, _ in page_requests()]
+    assert f"{base_url}/blog/post-1" in crawler.urls
+
+
+def test_spaces_requests_by_crawl_delay(start_site):
+    base_url = start_site(pages=3, crawl_delay=1)
+
+    docs = crawl(SitemapCrawler(), f"{base_url}/sitemap.xml")
+
+    assert len(docs) == 3
+    times = sorted(t for t, _, _ in page_requests())
+    assert min(b - a for a, b in zip(times, times[1:])) >= 0.95
+
+
+def test_recrawl_skips_unchanged_lastmod(start_site, tmp_path):
+    base_url = start_site(pages=3)
+    state = CrawlState(str(tmp_path / "state.json"))
+    remember(state, crawl(SitemapCrawler(), f"{base_url}/sitemap.xml", state))
+    fake_site_server.Handler.requests = []
+
+    docs = crawl(SitemapCrawler(), f"{base_url}/sitemap.xml", state)
+
+    assert docs == []
+    assert page_requests() == []
+
+
+def test_recrawl_sends_etag_and_keeps_unmodified_pages(start_site, tmp_path):
+    base_url = start_site(pages=3, lastmod="")
+    state = CrawlState(str(tmp_path / "state.json"))
+    first = crawl(SitemapCrawler(), f"{base_url}/sitemap.xml", state)
+    assert all(doc.metadata.get("etag") for doc in first)
+    remember(state, first)
+    fake_site_server.Handler.requests = []
+
+    docs = crawl(SitemapCrawler(), f"{base_url}/sitemap.xml", state)
+
+    assert docs == []
+    assert [status for _, _, status in page_requests()] == [304, 304, 304]
@@ -0,0 +1,112 @@
+import time
+
+import openai
+import pytest
+from langchain.embeddings import OpenAIEmbeddings
+from langchain.schema.embeddings import Embeddings
+
+from benchmarks import fake_embeddings_server
+from core import embeddings as core_embeddings
+from core.embeddings import BatchedEmbeddings, RateLimiter
+
+
+class ServerEmbeddings(Embeddings):
+    """Calls the fake server with the openai client and no retries of its own.
+
+    OpenAIEmbeddings always counts tokens with tiktoken, which downloads its
+    encodings, so the tests talk to the server directly.
+    """
+
+    def __init__(self, api_base):
+        self.api_base = api_base
+
+    def embed_documents(self, texts):
+        response = openai.Embedding.create(
+            input=texts,
+            model="text-embedding-ada-002",
+            api_key="test",
+            api_base=self.api_base,
+        )
+        return [item["embedding"] for item in response["data"]]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture(autouse=True)
+def offline_token_counts(monkeypatch):
+    # tiktoken은 인코딩 파일을 내려받으니 테스트에서는 단어 수로 센다
+    monkeypatch.setattr(core_embeddings, "count_tokens", lambda text: len(text.split()))
+
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(**options):
+        server = fake_embeddings_server.serve(port=0, **options)
+        servers.append(server)
+        return ServerEmbeddings(f"http://127.0.0.1:{server.server_address[1]}/v1")
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def statuses():
+    return [status for _, status in fake_embeddings_server.Handler.requests]
+
+
+def test_retries_rate_limited_batches(start_server):
+    client = start_server(requests_per_minute=2, period=0.5)
+    embeddings = BatchedEmbeddings(
+        client, batch_size=1, max_concurrency=4, backoff=0.6, max_backoff=1.0
+    )
+
+    vectors = embeddings.embed_documents([f"text {i}" for i in range(4)])
+
+    assert len(vectors) == 4
+    assert embeddings.stats["retries"] == 2
+    assert statuses().count(429) == 2
+    assert statuses().count(200) == 4
+
+
+def test_gives_up_after_max_retries(start_server):
+    client = start_server(requests_per_minute=1)
+    embeddings = BatchedEmbeddings(
+        client, batch_size=1, max_concurrency=1, max_retries=2, backoff=0.01
+    )
+
+    with pytest.raises(Exception):
+        embeddings.embed_documents(["first", "second"])
+
+    assert embeddings.stats["retries"] == 2
+    assert statuses() == [200, 429, 429, 429]
+
+
+def test_limiter_spaces_requests(start_server):
+    client = start_server()
+    limiter = RateLimiter(requests_per_minute=600)
+    # 버킷을 비워서 처음부터 분당 한도 간격으로 보내게 한다
+    limiter.requests = 0
+    embeddings = BatchedEmbeddings(
+        client, limiter=limiter, batch_size=1, max_concurrency=4
+    )
+
+    started_at = time.monotonic()
+    embeddings.embed_documents([f"text {i}" for i in range(5)])
+
+    times = sorted(t for t, _ in fake_embeddings_server.Handler.requests)
+    assert len(times) == 5
+    assert time.monotonic() - started_at >= 0.45
+    assert min(b - a for a, b in zip(times, times[1:])) >= 0.08
+
+
+def test_client_retries_are_turned_off():
+    client = OpenAIEmbeddings(openai_api_key="test", max_retries=6)
+
+    embeddings = BatchedEmbeddings(client)
+
+    assert embeddings.document_embeddings.max_retries == 0
+    assert client.max_retries == 6